@@ -0,0 +1,369 @@
+"""
+application benchmark: requests go through Kumquat.__call__
+with synthetic scope/receive/send (in-process) or through uvicorn
+with built-in async load generator (--e2e)
+
+python benchmarks/bench_app.py
+python benchmarks/bench_app.py --json results.json
+python benchmarks/bench_app.py --e2e --concurrency 64 --duration 10
+python benchmarks/bench_app.py --e2e --scenario json --duration 2
+"""
+import argparse
+import asyncio
+import collections
+import functools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import typing
+
+from kumquat.application import Kumquat
+from kumquat.response import TemplateResponse
+
+LARGE_BODY = b"x" * 1048576
+# size of http.request messages, servers pass large bodies by parts
+CHUNK_SIZE = 65536
+
+TEMPLATE = """<html><body><h1>{{ title }}</h1><ul>
+{% for item in items %}<li>{{ item.name }}: {{ item.value }}</li>{% endfor %}
+</ul></body></html>"""
+
+
+def create_app(templates_path: str) -> Kumquat:
+    app = Kumquat(templates_path=templates_path)
+
+    @app.get("/static")
+    async def static(request, response):
+        return "hello"
+
+    @app.get("/users/<name>/<age>")
+    async def params(request, response):
+        return request.path_dict["name"]
+
+    @app.get("/json")
+    async def json_route(request, response):
+        return {"items": [{"id": i, "name": f"item {i}"} for i in range(20)]}
+
+    @app.get("/template")
+    async def template(request, response):
+        items = [{"name": f"item {i}", "value": i} for i in range(20)]
+        return TemplateResponse("page.html", title="bench", items=items)
+
+    @app.post("/upload")
+    async def upload(request, response):
+        return str(len(await request.bytes()))
+
+    return app
+
+
+def create_middleware_app(templates_path: str, count: int = 5) -> Kumquat:
+    app = create_app(templates_path)
+    for _ in range(count):
+
+        @app.middleware("before")
+        async def before(request, response):
+            return None
+
+        @app.middleware("around")
+        async def around(request, response, call_next):
+            return await call_next()
+
+    return app
+
+
+class Scenario(typing.NamedTuple):
+    name: str
+    app: str  # "plain" or "middleware"
+    method: str
+    path: str
+    body: bytes = b""
+
+
+SCENARIOS = (
+    Scenario("static route", "plain", "GET", "/static"),
+    Scenario("param route", "plain", "GET", "/users/bob/21"),
+    Scenario("json", "plain", "GET", "/json"),
+    Scenario("template", "plain", "GET", "/template"),
+    Scenario("middleware x10", "middleware", "GET", "/static"),
+    Scenario("large body 1mb", "plain", "POST", "/upload", LARGE_BODY),
+)
+# load generator of e2e mode sends GET requests to plain app only
+E2E_SCENARIOS = tuple(
+    scenario
+    for scenario in SCENARIOS
+    if scenario.app == "plain" and scenario.method == "GET"
+)
+
+
+def make_scope(scenario: Scenario) -> typing.Dict[str, typing.Any]:
+    return {
+        "type": "http",
+        "http_version": "1.1",
+        "server": ("127.0.0.1", 8000),
+        "client": ("127.0.0.1", 51000),
+        "scheme": "http",
+        "method": scenario.method,
+        "root_path": "",
+        "path": scenario.path,
+        "raw_path": scenario.path.encode(),
+        "query_string": b"",
+        "headers": [
+            (b"host", b"localhost:8000"),
+            (b"user-agent", b"bench/1.0"),
+            (b"content-length", str(len(scenario.body)).encode()),
+        ],
+    }
+
+
+@functools.lru_cache()
+def body_chunks(body: bytes) -> typing.Tuple[bytes, ...]:
+    if not body:
+        return (b"",)
+    return tuple(body[i : i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+
+
+async def call(app: Kumquat, scenario: Scenario) -> None:
+    chunks = collections.deque(body_chunks(scenario.body))
+
+    async def receive():
+        if chunks:
+            body = chunks.popleft()
+            return {"type": "http.request", "body": body, "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    await app(make_scope(scenario), receive, send)
+
+
+def percentile(values: typing.List[int], part: float) -> float:
+    return values[min(int(len(values) * part), len(values) - 1)]
+
+
+async def run_scenario(
+    app: Kumquat, scenario: Scenario, number: int
+) -> typing.Dict[str, typing.Any]:
+    for _ in range(min(number, 100)):  # warmup
+        await call(app, scenario)
+
+    latencies = []
+    started = time.perf_counter_ns()
+    for _ in range(number):
+        request_started = time.perf_counter_ns()
+        await call(app, scenario)
+        latencies.append(time.perf_counter_ns() - request_started)
+    elapsed = time.perf_counter_ns() - started
+    latencies.sort()
+
+    # peak of memory allocated while request is handled
+    allocations = []
+    tracemalloc.start()
+    for _ in range(min(number, 500)):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await call(app, scenario)
+        allocations.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return {
+        "scenario": scenario.name,
+        "requests": number,
+        "rps": number / elapsed * 1e9,
+        "p50_us": percentile(latencies, 0.5) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "mean_us": statistics.mean(latencies) / 1000,
+        "alloc_bytes": statistics.mean(allocations),
+    }
+
+
+async def in_process(number: int, names: typing.Sequence[str]) -> typing.List[dict]:
+    with tempfile.TemporaryDirectory() as templates_path:
+        with open(os.path.join(templates_path, "page.html"), "w") as file:
+            file.write(TEMPLATE)
+        apps = {
+            "plain": create_app(templates_path),
+            "middleware": create_middleware_app(templates_path),
+        }
+        results = []
+        for scenario in SCENARIOS:
+            if names and scenario.name not in names:
+                continue
+            scenario_number = number // 20 if scenario.body else number
+            results.append(
+                await run_scenario(apps[scenario.app], scenario, scenario_number)
+            )
+        return results
+
+
+async def _http_worker(
+    host: str,
+    port: int,
+    request: bytes,
+    deadline: float,
+    latencies: typing.List[int],
+    errors: typing.List[int],
+) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.monotonic() < deadline:
+            started = time.perf_counter_ns()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter_ns() - started)
+            if not head.startswith(b"HTTP/1.1 2"):
+                errors.append(1)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        errors.append(1)
+    finally:
+        writer.close()
+
+
+async def load(
+    host: str, port: int, scenario: Scenario, concurrency: int, duration: float
+) -> typing.Dict[str, typing.Any]:
+    """
+    keep-alive http/1.1 load generator
+    :param host:
+    :param port:
+    :param scenario: GET scenario
+    :param concurrency: count of connections
+    :param duration: seconds
+    :return:
+    """
+    request = (
+        f"GET {scenario.path} HTTP/1.1\r\nHost: {host}:{port}\r\n\r\n".encode()
+    )
+    latencies: typing.List[int] = []
+    errors: typing.List[int] = []
+    deadline = time.monotonic() + duration
+    started = time.perf_counter_ns()
+    await asyncio.gather(
+        *(
+            _http_worker(host, port, request, deadline, latencies, errors)
+            for _ in range(concurrency)
+        )
+    )
+    elapsed = time.perf_counter_ns() - started
+    latencies.sort()
+    return {
+        "scenario": f"e2e {scenario.name}",
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed * 1e9,
+        "p50_us": percentile(latencies, 0.5) / 1000 if latencies else None,
+        "p99_us": percentile(latencies, 0.99) / 1000 if latencies else None,
+        "mean_us": statistics.mean(latencies) / 1000 if latencies else None,
+    }
+
+
+def serve(port: int) -> None:
+    import uvicorn
+
+    with tempfile.TemporaryDirectory() as templates_path:
+        with open(os.path.join(templates_path, "page.html"), "w") as file:
+            file.write(TEMPLATE)
+        uvicorn.run(
+            create_app(templates_path), port=port, log_level="warning", access_log=False
+        )
+
+
+async def end_to_end(
+    port: int, concurrency: int, duration: float, names: typing.Sequence[str]
+) -> typing.List[dict]:
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", str(port)],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    try:
+        for _ in range(100):
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+            except OSError:
+                await asyncio.sleep(0.1)
+            else:
+                writer.close()
+                break
+        results = []
+        for scenario in E2E_SCENARIOS:
+            if names and scenario.name not in names:
+                continue
+            results.append(
+                await load("127.0.0.1", port, scenario, concurrency, duration)
+            )
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--scenario", action="append", default=[])
+    parser.add_argument("--json", help="file for results, - for stdout")
+    parser.add_argument("--e2e", action="store_true", help="run through uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return None
+
+    scenarios = E2E_SCENARIOS if args.e2e else SCENARIOS
+    names = {scenario.name for scenario in scenarios}
+    unknown = [name for name in args.scenario if name not in names]
+    if unknown:
+        parser.error(
+            f"unknown {'e2e ' if args.e2e else ''}scenario {', '.join(unknown)}"
+            f" (choose from {', '.join(sorted(names))})"
+        )
+
+    if args.e2e:
+        results = asyncio.run(
+            end_to_end(args.port, args.concurrency, args.duration, args.scenario)
+        )
+    else:
+        results = asyncio.run(in_process(args.number, args.scenario))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mode": "e2e" if args.e2e else "in-process",
+        "results": results,
+    }
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    elif args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.json != "-":
+        for result in results:
+            line = (
+                f"{result['scenario']:<20} {result['rps']:10.0f} req/s"
+                f"  p50 {result['p50_us'] or 0:8.1f} us"
+                f"  p99 {result['p99_us'] or 0:8.1f} us"
+            )
+            if "alloc_bytes" in result:
+                line += f"  {result['alloc_bytes']:10.0f} bytes/request"
+            print(line)
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+json codecs benchmark: encoding and decoding of typical api payloads
+with every installed codec
+
+python benchmarks/bench_json.py
+"""
+import datetime
+import timeit
+
+from kumquat.serialization import CODECS
+
+SMALL = {"status": "ok", "user": {"id": 42, "name": "kumquat", "active": True}}
+LIST = {
+    "users": [
+        {
+            "id": i,
+            "name": f"user{i}",
+            "email": f"user{i}@example.com",
+            "tags": ["a", "b", "c"],
+            "score": i * 1.5,
+            "active": i % 2 == 0,
+        }
+        for i in range(500)
+    ]
+}
+DATETIMES = {
+    "events": [
+        {"id": i, "created_at": datetime.datetime(2020, 1, 1) + datetime.timedelta(i)}
+        for i in range(500)
+    ]
+}
+PAYLOADS = {"small": SMALL, "list(500)": LIST, "datetimes(500)": DATETIMES}
+
+
+def bench(number: int = 200) -> None:
+    for payload_name, payload in PAYLOADS.items():
+        print(payload_name)
+        for codec_name, codec_class in CODECS.items():
+            codec = codec_class()
+            encoded = codec.dumps(payload)
+            dumps = timeit.timeit(lambda: codec.dumps(payload), number=number)
+            loads = timeit.timeit(lambda: codec.loads(encoded), number=number)
+            print(
+                f"  {codec_name:<8} dumps: {dumps / number * 1e6:10.1f} us"
+                f"  loads: {loads / number * 1e6:10.1f} us"
+                f"  size: {len(encoded)}"
+            )
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,99 @@
+"""
+request benchmark: construction time and allocations of lazy Request
+vs old eager implementation
+
+python benchmarks/bench_request.py
+"""
+import time
+import tracemalloc
+import typing
+import urllib.parse
+
+from kumquat.request import Request, _client, _server
+
+
+class LegacyRequest:
+    """
+    old Request.__init__, everything is parsed eagerly
+    """
+
+    charset = "utf-8"
+
+    def __init__(self, scope, receive):
+        self._receive = receive
+        self._body: typing.Dict[str, str] = {}
+
+        self._type = scope.get("type")
+        self.http_version = scope.get("http_version")
+        self.server = _server(scope["server"][0], scope["server"][1])
+        self.client = _client(scope["client"][0], scope["client"][1])
+        self.scheme = scope.get("scheme")
+        self.method = scope.get("method")
+        self.root_path = scope.get("root_path")
+        self.path = scope["path"].rstrip("/") if scope["path"] != "/" else scope["path"]
+        self._path_dict: typing.Dict[str, str] = {}
+        self.raw_path = scope.get("raw_path")
+        self.query_string = scope.get("query_string")
+        self.query: typing.Dict[str, str] = {}
+        if self.query_string:
+            self.query_string = self.query_string.decode(self.charset)
+            self.query = dict(
+                urllib.parse.parse_qsl(self.query_string, encoding=self.charset)
+            )
+
+        self.headers = dict(scope["headers"])
+        self._stream_consumed = False
+        self._is_disconnected = False
+
+
+SCOPE = {
+    "type": "http",
+    "http_version": "1.1",
+    "server": ("127.0.0.1", 8000),
+    "client": ("127.0.0.1", 51000),
+    "scheme": "http",
+    "method": "GET",
+    "root_path": "",
+    "path": "/users/42",
+    "raw_path": b"/users/42",
+    "query_string": b"page=2&sort=name&filter=active",
+    "headers": [
+        (b"host", b"localhost:8000"),
+        (b"user-agent", b"bench/1.0"),
+        (b"accept", b"*/*"),
+        (b"accept-encoding", b"gzip, deflate, br"),
+        (b"cookie", b"session=abc; theme=dark"),
+        (b"connection", b"keep-alive"),
+    ],
+}
+
+
+async def _receive():
+    return {"type": "http.request"}
+
+
+def allocations(request_class: type, number: int = 1000) -> float:
+    requests = []
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    for _ in range(number):
+        requests.append(request_class(SCOPE, _receive))
+    end = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in end.compare_to(start, "filename"))
+    return allocated / number
+
+
+def timing(request_class: type, number: int = 100000) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        request_class(SCOPE, _receive)
+    return (time.perf_counter() - start) / number * 1e9
+
+
+if __name__ == "__main__":
+    for name, request_class in (("before", LegacyRequest), ("after", Request)):
+        print(
+            f"{name:<8} {timing(request_class):8.0f} ns/request"
+            f"  {allocations(request_class):8.0f} bytes/request"
+        )
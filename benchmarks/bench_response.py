@@ -0,0 +1,113 @@
+"""
+response benchmark: responses per second of SimpleResponse.__call__
+vs old implementation (body encoded twice, headers encoded every call),
+both encode json with the same codec (json_codec_var, orjson when installed)
+
+python benchmarks/bench_response.py
+"""
+import asyncio
+import time
+import typing
+
+from kumquat.context import json_codec_var
+from kumquat.response import JsonResponse, TextResponse
+
+
+class LegacyResponse:
+    """
+    old SimpleResponse.__call__
+    """
+
+    charset = "utf-8"
+    content_type = "text/plain"
+
+    def __init__(self, body: typing.Any, headers=None, status_code: int = 200):
+        self.body = body
+        self.status_code = status_code
+        self.custom_headers = headers
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self._create_headers(),
+            }
+        )
+        await send({"type": "http.response.body", "body": self.parse_body()})
+
+    def _create_headers(self):
+        _headers = [
+            [b"content-length", str(len(self.parse_body())).encode(self.charset)],
+            [
+                b"content-type",
+                f"{self.content_type}; charset={self.charset}".encode(self.charset),
+            ],
+        ]
+        if self.custom_headers is not None:
+            _header = []
+            for header in self.custom_headers:
+                for k, v in header.items():
+                    _header = [k.encode(self.charset), v.encode(self.charset)]
+                _headers.append(_header)
+        return _headers
+
+    def parse_body(self) -> bytes:
+        if isinstance(self.body, bytes):
+            return self.body
+        if isinstance(self.body, dict):
+            return json_codec_var.get().dumps(self.body)
+        return self.body.encode(self.charset)
+
+
+class LegacyJsonResponse(LegacyResponse):
+    content_type = "application/json"
+
+
+async def _send(message) -> None:
+    pass
+
+
+async def _receive():
+    return {"type": "http.request"}
+
+
+PAYLOAD = {
+    "users": [
+        {"id": i, "name": f"user{i}", "tags": ["a", "b", "c"], "active": i % 2 == 0}
+        for i in range(50)
+    ]
+}
+HEADERS = [{"x-request-id": "abc", "cache-control": "no-cache"}]
+
+
+async def bench(name: str, factory: typing.Callable, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        await factory()({}, _receive, _send)
+    rps = number / (time.perf_counter() - start)
+    print(f"  {name:<8} {rps:12.0f} responses/sec")
+    return rps
+
+
+async def main(number: int = 20000) -> None:
+    print(f"json codec: {json_codec_var.get().name}")
+    cases = {
+        "text": (
+            lambda: LegacyResponse("hello world", headers=HEADERS),
+            lambda: TextResponse("hello world", headers=HEADERS),
+        ),
+        "json": (
+            lambda: LegacyJsonResponse(PAYLOAD, headers=HEADERS),
+            lambda: JsonResponse(PAYLOAD, headers=HEADERS),
+        ),
+    }
+    for case, (legacy, current) in cases.items():
+        print(case)
+        before = await bench("before", legacy, number)
+        after = await bench("after", current, number)
+        print(f"  x{after / before:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+router benchmark: segment tree router (with and without match cache)
+vs old linear vbml scan
+
+python benchmarks/bench_router.py
+"""
+import timeit
+import typing
+
+from kumquat.route import Route, Router
+
+
+class LinearRouter(Router):
+    """
+    old router, every request walks all vbml patterns
+    """
+
+    def get_route(
+        self, path: str, method: str
+    ) -> typing.Tuple[typing.Dict[str, str], typing.Optional[Route]]:
+        for route_methods, route_pattern in self.routes:
+            if path == route_pattern.text:
+                return {}, self.routes.get((route_methods, route_pattern))
+
+            if self.patcher.check(path, route_pattern):
+                return (
+                    self.patcher.check(path, route_pattern),
+                    self.routes.get((route_methods, route_pattern)),
+                )
+        return {}, None
+
+
+async def handler(request, response):
+    return ""
+
+
+def fill(router: Router, count: int) -> None:
+    for i in range(count):
+        if i % 2:
+            path = f"/static{i}/page"
+        else:
+            path = f"/dynamic{i}/<name>/<age>"
+        router.add_route(Route(path, handler, methods=("GET",)))
+
+
+def bench(count: int, number: int = 2000) -> None:
+    last = count - 1 if (count - 1) % 2 else count - 2
+    paths = {
+        "static (last)": f"/static{last}/page",
+        "dynamic (last)": f"/dynamic{last - 1}/bob/21",
+        "not found": "/nothing/here",
+    }
+    print(f"routes: {count}")
+    for name, path in paths.items():
+        results = []
+        for router in (LinearRouter(), Router(cache_size=0), Router()):
+            fill(router, count)
+            seconds = timeit.timeit(
+                lambda: router.get_route(path, "GET"), number=number
+            )
+            results.append(seconds / number * 1e6)
+        linear, tree, cached = results
+        print(
+            f"  {name:<16} linear: {linear:10.2f} us"
+            f"  tree: {tree:8.2f} us  x{linear / tree:<7.1f}"
+            f"  cached: {cached:6.2f} us  x{linear / cached:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    for routes_count in (10, 100, 1000):
+        bench(routes_count, number=200 if routes_count == 1000 else 2000)
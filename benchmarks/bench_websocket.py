@@ -0,0 +1,150 @@
+"""
+websocket broadcast stress benchmark: thousands of in-process connections
+go through Kumquat.__call__, messages are published to all of them,
+part of connections are slow consumers which have to be dropped
+
+python benchmarks/bench_websocket.py --connections 5000 --messages 200 --memory
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+import typing
+
+from kumquat.application import Kumquat
+from kumquat.websocket import Broadcast, WebSocket
+
+
+def create_app(broadcast: Broadcast) -> Kumquat:
+    app = Kumquat()
+
+    @app.websocket("/feed")
+    async def feed(websocket: WebSocket):
+        await websocket.accept()
+        broadcast.add(websocket)
+        try:
+            async for _ in websocket.iter_text():
+                pass
+        finally:
+            broadcast.discard(websocket)
+
+    return app
+
+
+class Connection:
+    """
+    asgi side of one client connection
+    """
+
+    def __init__(self, slow: bool):
+        self.slow = slow
+        self.received = 0
+        self.closed = False
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.inbox.put_nowait({"type": "websocket.connect"})
+
+    async def receive(self) -> typing.Dict[str, typing.Any]:
+        return await self.inbox.get()
+
+    async def send(self, message: typing.Dict[str, typing.Any]) -> None:
+        if message["type"] == "websocket.send":
+            if self.slow:
+                await asyncio.sleep(3600)
+            self.received += 1
+        elif message["type"] == "websocket.close":
+            self.closed = True
+
+
+async def run(
+    connections: int, messages: int, slow_part: float, payload: int, memory: bool
+) -> typing.Dict[str, typing.Any]:
+    broadcast = Broadcast()
+    app = create_app(broadcast)
+    slow_every = int(1 / slow_part) if slow_part else 0
+    clients = [
+        Connection(slow=bool(slow_every) and i % slow_every == 0)
+        for i in range(connections)
+    ]
+
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    tasks = [
+        asyncio.ensure_future(
+            app(
+                {"type": "websocket", "path": "/feed", "headers": []},
+                client.receive,
+                client.send,
+            )
+        )
+        for client in clients
+    ]
+    while len(broadcast) < connections:
+        await asyncio.sleep(0.01)
+    connected = time.perf_counter() - started
+
+    message = json.dumps({"data": "x" * payload})
+    publish_time = 0.0
+    started = time.perf_counter()
+    for _ in range(messages):
+        publish_started = time.perf_counter()
+        broadcast.publish(message)
+        publish_time += time.perf_counter() - publish_started
+        await asyncio.sleep(0)
+    fast = [client for client in clients if not client.slow]
+    while sum(client.received for client in fast) < len(fast) * messages:
+        await asyncio.sleep(0.001)
+    delivered_time = time.perf_counter() - started
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 1048576
+        tracemalloc.stop()
+
+    for client in clients:
+        client.inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.gather(*tasks)
+
+    delivered = sum(client.received for client in clients)
+    return {
+        "connections": connections,
+        "messages": messages,
+        "connect_s": connected,
+        "publish_us": publish_time / messages * 1e6,
+        "delivered": delivered,
+        "delivered_per_s": delivered / delivered_time,
+        "dropped": broadcast.dropped,
+        "slow": sum(client.slow for client in clients),
+        "peak_memory_mb": peak,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--slow", type=float, default=0.01, help="part of slow")
+    parser.add_argument("--payload", type=int, default=64)
+    parser.add_argument("--memory", action="store_true", help="trace memory (slow)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    result = asyncio.run(
+        run(args.connections, args.messages, args.slow, args.payload, args.memory)
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return None
+    print(
+        f"{result['connections']} connections connected in {result['connect_s']:.2f}s\n"
+        f"publish: {result['publish_us']:.0f} us/message to all connections\n"
+        f"delivered: {result['delivered']} ({result['delivered_per_s']:.0f}/s)\n"
+        f"slow consumers dropped: {result['dropped']} of {result['slow']}"
+    )
+    if result["peak_memory_mb"] is not None:
+        print(f"peak memory: {result['peak_memory_mb']:.1f} MB")
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+command line runner: kumquat module:app --workers 4
+"""
+import argparse
+import importlib
+import os
+import sys
+import typing
+
+from kumquat.exceptions import KumquatException
+from kumquat.server import Server
+
+
+def import_app(app_path: str) -> typing.Callable:
+    """
+    import app from "module:attribute" string
+    :param app_path:
+    :return:
+    """
+    module_name, _, attribute = app_path.partition(":")
+    if not module_name or not attribute:
+        raise KumquatException(f'app path <<{app_path}>> must be "module:attribute"')
+    module = importlib.import_module(module_name)
+    try:
+        return getattr(module, attribute)
+    except AttributeError:
+        raise KumquatException(
+            f"module <<{module_name}>> has no attribute <<{attribute}>>"
+        )
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="kumquat", description="run kumquat application"
+    )
+    parser.add_argument("app", help='app path, "module:attribute"')
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--loop", default="auto", help="auto, uvloop or asyncio")
+    parser.add_argument("--http", default="auto", help="auto, httptools or h11")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5)
+    parser.add_argument("--limit-concurrency", type=int, default=None)
+    parser.add_argument("--max-requests", type=int, default=None)
+    parser.add_argument("--max-requests-jitter", type=int, default=0)
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.getcwd())
+    Server(
+        import_app(args.app),
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=args.loop,
+        http=args.http,
+        backlog=args.backlog,
+        keep_alive=args.keep_alive,
+        limit_concurrency=args.limit_concurrency,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+        log_level=args.log_level,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+admission control: concurrency limits and rate limiting
+"""
+import asyncio
+import collections
+import math
+import time
+import typing
+
+from kumquat.exceptions import KumquatException, Overloaded, RateLimited
+
+
+class ConcurrencyLimit:
+    """
+    limit of requests handled at once,
+    others wait in bounded queue and get 503 when it is full
+    or when they waited longer than queue_timeout
+
+    :param limit: max count of requests handled at once
+    :param max_queue: max count of waiting requests, 0 rejects at once
+    :param queue_timeout: max seconds in queue, None waits until slot is free
+    :param retry_after: seconds in retry-after header of 503 response
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        max_queue: int = 0,
+        queue_timeout: typing.Optional[float] = None,
+        retry_after: int = 1,
+    ):
+        if limit < 1:
+            raise KumquatException("concurrency limit must be positive")
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters: typing.Deque[asyncio.Future] = collections.deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """
+        take slot, wait for it in queue if all are busy
+        :raises Overloaded: queue is full or queue timeout is exceeded
+        :return:
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove(waiter)
+            self.timed_out += 1
+            raise Overloaded(self.retry_after)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # slot was given right before cancellation
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        return None
+
+    def release(self, elapsed: float = 0.0) -> None:
+        """
+        free slot and pass it to the first waiting request
+        :param elapsed: seconds request held the slot
+        :return:
+        """
+        self.active -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.active < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.active += 1
+
+    def _remove(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.limit}, active={self.active})"
+
+
+class AdaptiveLimit(ConcurrencyLimit):
+    """
+    concurrency limit adjusted from observed latency (aimd):
+    it is decreased by backoff factor when request is slower than
+    target_latency, and increased by one after limit fast requests
+
+    :param target_latency: seconds
+    :param initial_limit:
+    :param min_limit:
+    :param max_limit:
+    :param backoff: factor of limit decrease
+    """
+
+    def __init__(
+        self,
+        target_latency: float,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 1000,
+        backoff: float = 0.9,
+        max_queue: int = 0,
+        queue_timeout: typing.Optional[float] = None,
+        retry_after: int = 1,
+    ):
+        super().__init__(
+            initial_limit,
+            max_queue=max_queue,
+            queue_timeout=queue_timeout,
+            retry_after=retry_after,
+        )
+        self.target_latency = target_latency
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self._fast = 0
+
+    def release(self, elapsed: float = 0.0) -> None:
+        if elapsed > self.target_latency:
+            self.limit = max(self.min_limit, int(self.limit * self.backoff))
+            self._fast = 0
+        else:
+            self._fast += 1
+            if self._fast >= self.limit:
+                self.limit = min(self.max_limit, self.limit + 1)
+                self._fast = 0
+        super().release(elapsed)
+
+
+def client_host(request: typing.Any) -> str:
+    client = request.client
+    return client.host if client is not None else ""
+
+
+class RateLimiter:
+    """
+    in-memory token bucket per key (client address by default),
+    requests over the rate get 429
+
+    :param rate: tokens added per second
+    :param burst: size of bucket
+    :param key: func(request) -> key of bucket
+    :param max_keys: count of buckets kept, the least recently used are dropped
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        key: typing.Callable[[typing.Any], typing.Hashable] = client_host,
+        max_keys: int = 65536,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        self.max_keys = max_keys
+        self.limited = 0
+        # key -> [tokens, last update time]
+        self._buckets: "collections.OrderedDict[typing.Hashable, typing.List[float]]"
+        self._buckets = collections.OrderedDict()
+
+    def check(self, request: typing.Any) -> None:
+        """
+        take token for request
+        :raises RateLimited: bucket of request is empty
+        :return:
+        """
+        key = self.key(request)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] < 1:
+            self.limited += 1
+            raise RateLimited(max(math.ceil((1 - bucket[0]) / self.rate), 1))
+        bucket[0] -= 1
+        return None
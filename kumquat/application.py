@@ -1,25 +1,48 @@
 """
 kumquat application
 """
+import time
+import types
+import asyncio
 import typing
 import logging
 import inspect
+import functools
 
 import uvicorn
 
-from kumquat.context import env_var
+from kumquat.context import executors_var, templates_var, json_codec_var
 from kumquat.response import (
     TextResponse,
     JsonResponse,
     SimpleResponse,
     TemplateResponse,
     HTMLResponse,
+    StreamingResponse,
 )
 from kumquat.route import Route, Router
 from kumquat.request import Request
-from kumquat.exceptions import KumquatException
+from kumquat.staticfiles import StaticFiles
+from kumquat.templating import Templates
+from kumquat.serialization import JSONCodec, DefaultSerializer, get_codec
+from kumquat.compression import Compression
+from kumquat.cache import (
+    CacheBackend,
+    CacheEntry,
+    CachedResponse,
+    LocalCache,
+    make_cache_key,
+    sets_cookie,
+)
+from kumquat.exceptions import KumquatException, HTTPException
 from kumquat._types import Method, Scope, Receive, Send
-from kumquat.utils import BackgroundTask
+from kumquat.utils import Executor, SingleFlight, State
+from kumquat.middleware import Middleware, Handler, compile_chain
+from kumquat.server import Server
+from kumquat.metrics import Metrics
+from kumquat.profiling import Profiler
+from kumquat.admission import ConcurrencyLimit, RateLimiter
+from kumquat.websocket import WebSocket, WebSocketDisconnect
 
 try:
     from pyngrok import ngrok
@@ -30,11 +53,15 @@ logger = logging.getLogger(__name__)
 
 RouteFunc = typing.Callable[[Request, SimpleResponse], typing.Any]
 
+# pseudo method of routes in websocket router
+WEBSOCKET = Method("WEBSOCKET")
+
 
 def _dispatch_simple_response(
     data: SimpleResponse, status_code: int, response: SimpleResponse
 ) -> SimpleResponse:
-    data.custom_headers = response.custom_headers
+    if data is not response:
+        data.custom_headers = response.custom_headers + data.custom_headers
     data.status_code = status_code
     return data
 
@@ -56,14 +83,53 @@ def _dispatch_lambda_factory(
     return lambda *args: _dispatch_factory(*args, response_class=response_class)
 
 
+def _dispatch_empty(
+    data: None, status_code: int, response: SimpleResponse
+) -> SimpleResponse:
+    return TextResponse(b"", status_code=status_code, headers=response.custom_headers)
+
+
 _DISPATCH_TYPES = {
     SimpleResponse: _dispatch_simple_response,
     HTMLResponse: _dispatch_simple_response,
     TemplateResponse: _dispatch_simple_response,
     str: _dispatch_lambda_factory(TextResponse),
+    bytes: _dispatch_lambda_factory(TextResponse),
+    type(None): _dispatch_empty,
     dict: _dispatch_lambda_factory(JsonResponse),
+    list: _dispatch_lambda_factory(JsonResponse),
+    types.AsyncGeneratorType: _dispatch_lambda_factory(StreamingResponse),
+    types.GeneratorType: _dispatch_lambda_factory(StreamingResponse),
 }
 
+_DISPATCH_CACHE: typing.Dict[type, typing.Callable] = {}
+
+
+def _dispatch_text(
+    data: typing.Any, status_code: int, response: SimpleResponse
+) -> SimpleResponse:
+    return TextResponse(
+        str(data), status_code=status_code, headers=response.custom_headers,
+    )
+
+
+def _get_dispatcher(data_type: type) -> typing.Callable:
+    """
+    find dispatcher for type by its mro, result is cached per type
+    :param data_type:
+    :return:
+    """
+    dispatcher = _DISPATCH_CACHE.get(data_type)
+    if dispatcher is None:
+        for base in data_type.__mro__:
+            dispatcher = _DISPATCH_TYPES.get(base)
+            if dispatcher is not None:
+                break
+        else:
+            dispatcher = _dispatch_text
+        _DISPATCH_CACHE[data_type] = dispatcher
+    return dispatcher
+
 
 def _process_route_result(
     route_result: typing.Any, response: SimpleResponse
@@ -77,13 +143,173 @@ def _process_route_result(
         status_code = route_result[1]
     else:
         data = route_result
-    result: typing.Optional[typing.Callable] = _DISPATCH_TYPES.get(type(data))
-    if result is not None:
-        return result(data, status_code, response)
+    return _get_dispatcher(type(data))(data, status_code, response)
 
-    return TextResponse(
-        str(data), status_code=status_code, headers=response.custom_headers,
-    )
+
+def _response_class_dispatcher(
+    response_class: typing.Type[SimpleResponse],
+) -> typing.Callable:
+    def dispatcher(route_result: typing.Any, response: SimpleResponse):
+        status_code = response.status_code
+        if isinstance(route_result, tuple):
+            route_result, status_code = route_result[0], route_result[1]
+        if isinstance(route_result, SimpleResponse):
+            return _dispatch_simple_response(route_result, status_code, response)
+        if route_result is None:
+            route_result = b""
+        return _dispatch_factory(route_result, status_code, response, response_class)
+
+    return dispatcher
+
+
+def _annotation_dispatcher(return_type: type) -> typing.Callable:
+    expected_dispatcher = _get_dispatcher(return_type)
+
+    def dispatcher(route_result: typing.Any, response: SimpleResponse):
+        if type(route_result) is return_type:
+            return expected_dispatcher(route_result, response.status_code, response)
+        return _process_route_result(route_result, response)
+
+    return dispatcher
+
+
+def _async_generator_handler(func: RouteFunc) -> RouteFunc:
+    """
+    wrap async generator route func, generator is returned
+    from handler and streamed with StreamingResponse
+    :param func:
+    :return:
+    """
+
+    @functools.wraps(func)
+    async def handler(request: Request, response: SimpleResponse):
+        return func(request, response)
+
+    return handler
+
+
+def _sync_handler(func: RouteFunc, executor: Executor) -> RouteFunc:
+    """
+    wrap sync route func, it is run in executor
+    :param func:
+    :param executor:
+    :return:
+    """
+
+    @functools.wraps(func)
+    async def handler(request: Request, response: SimpleResponse):
+        return await executor.run(func, request, response)
+
+    return handler
+
+
+def _exception_response(exc: HTTPException) -> SimpleResponse:
+    return TextResponse(exc.detail, status_code=exc.status_code, headers=exc.headers)
+
+
+async def _admit(
+    limit: typing.Optional[ConcurrencyLimit],
+    rate_limiter: typing.Optional[RateLimiter],
+    handler: typing.Callable[..., typing.Awaitable[SimpleResponse]],
+    request: Request,
+    *args,
+) -> SimpleResponse:
+    """
+    call handler if request passes rate limiter and gets concurrency slot,
+    else 429 or 503 response is returned
+    :param limit:
+    :param rate_limiter:
+    :param handler:
+    :param request:
+    :param args:
+    :return:
+    """
+    try:
+        if rate_limiter is not None:
+            rate_limiter.check(request)
+        if limit is None:
+            return await handler(request, *args)
+        await limit.acquire()
+    except HTTPException as exc:
+        return _exception_response(exc)
+
+    started = time.monotonic()
+    try:
+        return await handler(request, *args)
+    finally:
+        limit.release(time.monotonic() - started)
+
+
+async def _guarded_call(
+    route: Route, request: Request, response: SimpleResponse
+) -> typing.Any:
+    """
+    call route func with timeout (504) and cancel it
+    when client disconnects (499, server drops it as connection is closed)
+    :param route:
+    :param request:
+    :param response:
+    :return:
+    """
+    if not route.cancel_on_disconnect:
+        try:
+            return await asyncio.wait_for(route.func(request, response), route.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Gateway Timeout")
+
+    task = asyncio.ensure_future(route.func(request, response))
+    watcher = request.watch_disconnect(task)
+    try:
+        return await asyncio.wait_for(task, route.timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(504, "Gateway Timeout")
+    except asyncio.CancelledError:
+        if task.cancelled() and request._is_disconnected:
+            raise HTTPException(499, "Client Closed Request")
+        raise
+    finally:
+        watcher.cancel()
+
+
+def _admission_handler(
+    handler: Handler,
+    limit: typing.Optional[ConcurrencyLimit],
+    rate_limiter: typing.Optional[RateLimiter],
+) -> Handler:
+    async def admitted(
+        request: Request, response: SimpleResponse, route: typing.Optional[Route]
+    ) -> SimpleResponse:
+        return await _admit(limit, rate_limiter, handler, request, response, route)
+
+    return admitted
+
+
+def _readiness_handler(app: "Kumquat") -> RouteFunc:
+    async def readiness(request: Request, response: SimpleResponse):
+        if app.ready:
+            return "OK"
+        return "Service Unavailable", 503
+
+    return readiness
+
+
+def _compile_dispatcher(route: Route) -> typing.Callable:
+    """
+    build result dispatcher for route once, from response_class
+    or from return annotation of route func
+    :param route:
+    :return:
+    """
+    if route.response_class is not None:
+        return _response_class_dispatcher(route.response_class)
+
+    try:
+        return_type = typing.get_type_hints(route.func).get("return")
+    except Exception:  # unresolvable forward references
+        return_type = None
+    if isinstance(return_type, type) and not issubclass(return_type, tuple):
+        return _annotation_dispatcher(return_type)
+    return _process_route_result
 
 
 class Kumquat:
@@ -91,25 +317,407 @@ class Kumquat:
     kumquat web application
     """
 
-    def __init__(self, templates_path: str = "templates/"):
-        self.router = Router()
-        self.middleware_stack: typing.List[
-            typing.Callable[[Request, SimpleResponse], typing.Any]
+    def __init__(
+        self,
+        templates_path: str = "templates/",
+        route_cache_size: int = 1024,
+        templates_auto_reload: bool = False,
+        templates_cache_size: int = 400,
+        templates_bytecode_cache: typing.Union[bool, str] = False,
+        precompile_templates: bool = False,
+        max_body_size: typing.Optional[int] = None,
+        body_spool_threshold: int = 1048576,
+        json_codec: typing.Union[str, JSONCodec, None] = None,
+        json_default: typing.Optional[DefaultSerializer] = None,
+        compression: typing.Optional[Compression] = None,
+        cache_backend: typing.Optional[CacheBackend] = None,
+        executors: typing.Optional[typing.Dict[str, Executor]] = None,
+        readiness_path: typing.Optional[str] = None,
+        metrics: typing.Optional[Metrics] = None,
+        metrics_path: typing.Optional[str] = "/metrics",
+        profiler: typing.Optional[Profiler] = None,
+        concurrency_limit: typing.Optional[ConcurrencyLimit] = None,
+        rate_limiter: typing.Optional[RateLimiter] = None,
+        handler_timeout: typing.Optional[float] = None,
+        cancel_on_disconnect: bool = False,
+    ):
+        """
+        :param templates_path: directory with jinja2 templates
+        :param route_cache_size: size of router lru cache for dynamic paths
+        :param templates_auto_reload: recompile changed templates (dev mode)
+        :param templates_cache_size: count of compiled templates kept in memory
+        :param templates_bytecode_cache: cache template bytecode on disk,
+        True uses jinja2 directory in temp dir, or pass directory path
+        :param precompile_templates: compile all templates on app creation
+        :param max_body_size: max request body size, bigger bodies get 413
+        :param body_spool_threshold: request body bigger than this
+        is spooled to disk in request.file()
+        :param json_codec: "orjson", "ujson", "json" or JSONCodec instance,
+        the fastest installed one is used by default
+        :param json_default: function for serializing objects unknown to json
+        :param compression: Compression() for compressing responses
+        for clients accepting gzip, br or zstd
+        :param cache_backend: backend for routes with cache ttl,
+        LocalCache() by default
+        :param executors: executors by name for sync route funcs and blocking
+        middlewares, replace or add to default "thread" and "process" ones
+        (app.executors, every app has its own pools)
+        :param readiness_path: path of route answering 200 when app is ready
+        and 503 before startup hooks are done or after shutdown started
+        :param metrics: Metrics() for recording request counters and latency
+        histograms, disabled by default
+        :param metrics_path: path of route with metrics in prometheus format,
+        None disables the route
+        :param profiler: Profiler() for profiling sampled and slow requests
+        :param concurrency_limit: ConcurrencyLimit() or AdaptiveLimit()
+        for all requests, requests over it get 503
+        :param rate_limiter: RateLimiter() for all requests,
+        requests over it get 429
+        :param handler_timeout: default timeout of route funcs in seconds,
+        504 is sent when it is exceeded
+        :param cancel_on_disconnect: cancel route funcs when client disconnects
+        by default (disconnect is watched in background task)
+        """
+        self.router = Router(cache_size=route_cache_size)
+        # websocket routes are kept apart, http requests never match them
+        self.websocket_router = Router(cache_size=route_cache_size)
+        self.max_body_size = max_body_size
+        self.body_spool_threshold = body_spool_threshold
+        self.middleware_stack: typing.List[Middleware] = []
+        self.asgi_middleware: typing.List[
+            typing.Tuple[typing.Callable, typing.Dict[str, typing.Any]]
         ] = []
-        env_var.set(templates_path)
+        self._handler: typing.Optional[Handler] = None
+        self._asgi_app: typing.Optional[typing.Callable] = None
+        self._http_app: typing.Callable = self._app
+        self.static_routes: typing.List[Route] = []
+        self.templates = Templates(
+            templates_path,
+            auto_reload=templates_auto_reload,
+            cache_size=templates_cache_size,
+            bytecode_cache=templates_bytecode_cache,
+        )
+        self.json_codec = get_codec(json_codec, default=json_default)
+        self.cache_backend = cache_backend
+        self.single_flight = SingleFlight()
+        self.executors: typing.Dict[str, Executor] = {
+            "thread": Executor("thread"),
+            "process": Executor("process"),
+        }
+        for name, executor in (executors or {}).items():
+            executor.name = name
+            self.executors[name] = executor
+        self.compression = compression
+        if compression is not None:
+            compression.executor = self.executors["thread"]
+        self.state = State()
+        self.ready = False
+        self.startup_handlers: typing.List[typing.Callable] = []
+        self.shutdown_handlers: typing.List[typing.Callable] = []
+        self.metrics = metrics
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.executor = self.executors["thread"]
+        self.concurrency_limit = concurrency_limit
+        self.rate_limiter = rate_limiter
+        self.handler_timeout = handler_timeout
+        self.cancel_on_disconnect = cancel_on_disconnect
+        if precompile_templates:
+            self.templates.precompile()
+        if readiness_path is not None:
+            self.create_route(
+                readiness_path, _readiness_handler(self), methods=(Method("GET"),)
+            )
+        if metrics is not None and metrics_path is not None:
+            self.create_route(
+                metrics_path, metrics.handler(), methods=(Method("GET"),)
+            )
+
+    def shutdown_executors(self, wait: bool = True) -> None:
+        """
+        shutdown pools of all app executors, they are created again on next use
+        :param wait:
+        :return:
+        """
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait)
+
+    def compile(self) -> None:
+        """
+        build middleware chain and asgi middleware stack,
+        it is done on first request or after middleware is added
+        :return:
+        """
+        endpoint = self._prepare_response
+        self._http_app = self._app
+        if self.metrics is not None or self.profiler is not None:
+            self._http_app = self._instrumented_app
+            if self.profiler is not None or self.metrics.phases:
+                endpoint = self._timed_prepare_response
+        self._handler = compile_chain(
+            self.middleware_stack,
+            endpoint,
+            _process_route_result,
+            executor=self.executors["thread"],
+        )
+        if self.concurrency_limit is not None or self.rate_limiter is not None:
+            self._handler = _admission_handler(
+                self._handler, self.concurrency_limit, self.rate_limiter
+            )
+        asgi_app: typing.Callable = self._dispatch
+        for middleware_class, options in reversed(self.asgi_middleware):
+            asgi_app = middleware_class(asgi_app, **options)
+        self._asgi_app = asgi_app
+
+    def add_event_handler(self, event: str, func: typing.Callable) -> None:
+        """
+        add function called on lifespan startup or shutdown,
+        it takes no args and can be sync or async
+        :param event: "startup" or "shutdown"
+        :param func:
+        :return:
+        """
+        if event == "startup":
+            self.startup_handlers.append(func)
+        elif event == "shutdown":
+            self.shutdown_handlers.append(func)
+        else:
+            raise KumquatException("event must be <<startup>> or <<shutdown>>")
+
+    def on_startup(self, func: typing.Callable) -> typing.Callable:
+        """
+        decorator for startup hook, open pools here and save them to app.state
+
+        @app.on_startup
+        async def connect():
+            app.state.db = await create_pool()
+        :param func:
+        :return:
+        """
+        self.add_event_handler("startup", func)
+        return func
+
+    def on_shutdown(self, func: typing.Callable) -> typing.Callable:
+        """
+        decorator for shutdown hook, close pools opened on startup
+        :param func:
+        :return:
+        """
+        self.add_event_handler("shutdown", func)
+        return func
+
+    @staticmethod
+    async def _run_handlers(handlers: typing.List[typing.Callable]) -> None:
+        for handler in handlers:
+            result = handler()
+            if inspect.isawaitable(result):
+                await result
+
+    async def startup(self) -> None:
+        """
+        warm up app and run startup hooks, app is ready after it
+        :return:
+        """
+        self.compile()
+        await self._run_handlers(self.startup_handlers)
+        self.ready = True
+
+    async def shutdown(self) -> None:
+        """
+        run shutdown hooks and stop executors
+        :return:
+        """
+        self.ready = False
+        try:
+            await self._run_handlers(self.shutdown_handlers)
+        finally:
+            self.shutdown_executors()
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as exc:
+                    logger.exception("application startup failed")
+                    await send({"type": "lifespan.startup.failed", "message": str(exc)})
+                    return None
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                try:
+                    await self.shutdown()
+                except Exception as exc:
+                    logger.exception("application shutdown failed")
+                    await send(
+                        {"type": "lifespan.shutdown.failed", "message": str(exc)}
+                    )
+                    return None
+                await send({"type": "lifespan.shutdown.complete"})
+                return None
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        request = Request(scope, receive)
-        _response = SimpleResponse(b"")
+        if self._asgi_app is None:
+            self.compile()
+        scope["app"] = self
+        # per scope, apps in one process have their own templates and codec
+        templates_var.set(self.templates)
+        json_codec_var.set(self.json_codec)
+        executors_var.set(self.executors)
+        await self._asgi_app(scope, receive, send)
+        return None
+
+    async def _dispatch(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        innermost asgi app of middleware stack, handles scope by its type
+        :param scope:
+        :param receive:
+        :param send:
+        :return:
+        """
+        if scope["type"] == "http":
+            await self._http_app(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        return None
+
+    async def _websocket(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope["path"].rstrip("/") or "/"
+        path_dict, route = self.websocket_router.get_route(path, WEBSOCKET)
+        websocket = WebSocket(scope, receive, send)
+        if route is None or WEBSOCKET not in route.methods:
+            # close before accept, server answers 403
+            await websocket.close(1008)
+            return None
+
+        websocket.path_dict = path_dict
+        try:
+            await route.func(websocket)
+        except WebSocketDisconnect:
+            pass
+        except Exception:
+            logger.exception("websocket route %s failed", route.path)
+            await websocket.close(1011)
+            return None
+        await websocket.close()
+        return None
+
+    def _create_request(self, scope: Scope, receive: Receive) -> Request:
+        return Request(
+            scope,
+            receive,
+            max_body_size=self.max_body_size,
+            spool_threshold=self.body_spool_threshold,
+        )
+
+    def _find_route(self, request: Request) -> typing.Optional[Route]:
         path_dict, current_route = self.router.get_route(request.path, request.method)
+        if current_route is None and self.static_routes:
+            current_route = self._get_static_route(request.path)
         request.path_dict = path_dict
+        return current_route
 
-        response = await self._prepare_response(request, _response, current_route)
-        await self._call_middleware_stack(request, response)
-        await response(scope, receive, send)
+    def _wrap_send(self, request: Request, send: Send) -> Send:
+        if self.compression is not None:
+            accept_encoding = request.headers.get(b"accept-encoding")
+            encoder = self.compression.negotiate(accept_encoding)
+            if encoder is not None:
+                return self.compression.wrap_send(encoder, send)
+        return send
+
+    async def _app(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request = self._create_request(scope, receive)
+        current_route = self._find_route(request)
+        try:
+            response = await self._handler(
+                request, SimpleResponse(b""), current_route
+            )
+            await response(scope, request.receive, self._wrap_send(request, send))
+        finally:
+            request.close()
+
+    async def _instrumented_app(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        """
+        _app with measuring of request phases for metrics and profiler
+        :param scope:
+        :param receive:
+        :param send:
+        :return:
+        """
+        metrics = self.metrics
+        profiler = self.profiler
+        phases = profiler is not None or metrics.phases
+        started = time.perf_counter_ns()
+        profile = profiler.start() if profiler is not None else None
+        if metrics is not None:
+            metrics.in_flight += 1
+        request = self._create_request(scope, receive)
+        route_name = "<unmatched>"
+        status = 500
+        timings: typing.Dict[str, int] = {}
+
+        async def send_with_status(message: typing.Dict[str, typing.Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            current_route = self._find_route(request)
+            if current_route is not None:
+                route_name = current_route.path
+            routed = time.perf_counter_ns()
+            response = await self._handler(
+                request, SimpleResponse(b""), current_route
+            )
+            if phases:
+                handled = time.perf_counter_ns()
+                handler_time = scope.pop("kumquat.handler_time", 0)
+                timings["routing"] = routed - started
+                timings["handler"] = handler_time
+                timings["middleware"] = handled - routed - handler_time
+                if isinstance(response, TemplateResponse) and response.cacheable:
+                    await response.render()
+                    rendered = time.perf_counter_ns()
+                    timings["render"] = rendered - handled
+                    handled = rendered
+            await response(
+                scope, request.receive, self._wrap_send(request, send_with_status)
+            )
+            if phases:
+                timings["send"] = time.perf_counter_ns() - handled
+        finally:
+            request.close()
+            timings["total"] = time.perf_counter_ns() - started
+            if metrics is not None:
+                metrics.in_flight -= 1
+                metrics.count(route_name, request.method, status)
+                if metrics.phases:
+                    for phase, elapsed in timings.items():
+                        metrics.observe(route_name, phase, elapsed)
+                else:
+                    metrics.observe(route_name, "total", timings["total"])
+            if profile is not None:
+                await profiler.finish(profile, request, route_name, status, timings)
+
+    async def _timed_prepare_response(
+        self,
+        request: Request,
+        response: SimpleResponse,
+        current_route: typing.Optional[Route],
+    ) -> SimpleResponse:
+        started = time.perf_counter_ns()
+        try:
+            return await self._prepare_response(request, response, current_route)
+        finally:
+            request.scope["kumquat.handler_time"] = time.perf_counter_ns() - started
 
-    @staticmethod
     async def _prepare_response(
+        self,
         request: Request,
         response: SimpleResponse,
         current_route: typing.Optional[Route],
@@ -118,31 +726,162 @@ class Kumquat:
             return TextResponse("Not Found", status_code=404)
 
         if request.method not in current_route.methods:
-            return TextResponse("Method Not Allowed", status_code=405)
+            allow = ", ".join(
+                self.router.allowed_methods(request.path) or current_route.methods
+            )
+            return TextResponse(
+                "Method Not Allowed", status_code=405, headers=[{"allow": allow}]
+            )
 
-        route_result: typing.Any = await current_route.func(request, response)
-        return _process_route_result(route_result, response)
+        if current_route.limit is not None or current_route.rate_limit is not None:
+            return await _admit(
+                current_route.limit,
+                current_route.rate_limit,
+                self._route_response,
+                request,
+                response,
+                current_route,
+            )
+        return await self._route_response(request, response, current_route)
 
-    async def _call_middleware_stack(
-        self, request: Request, response: SimpleResponse
-    ) -> None:
-        for middleware_func in self.middleware_stack:
-            if inspect.iscoroutinefunction(middleware_func):
-                await middleware_func(request, response)
-            elif inspect.isfunction(middleware_func):
-                await (BackgroundTask(middleware_func, request, response))()
+    async def _route_response(
+        self, request: Request, response: SimpleResponse, current_route: Route
+    ) -> SimpleResponse:
+        if current_route.cache_ttl is not None and request.method == "GET":
+            return await self._cached_response(request, response, current_route)
+        if current_route.single_flight is not None:
+            result = await self._route_entry(request, response, current_route)
+            if isinstance(result, CacheEntry):
+                return CachedResponse(result)
+            return result
+        return await self._call_route(request, response, current_route)
+
+    @staticmethod
+    async def _call_route(
+        request: Request, response: SimpleResponse, route: Route
+    ) -> SimpleResponse:
+        try:
+            if route.timeout is None and not route.cancel_on_disconnect:
+                route_result: typing.Any = await route.func(request, response)
+            else:
+                route_result = await _guarded_call(route, request, response)
+        except HTTPException as exc:
+            return _exception_response(exc)
+        return route.dispatcher(route_result, response)
+
+    async def _entry_from_route(
+        self, request: Request, response: SimpleResponse, route: Route
+    ) -> typing.Union[CacheEntry, SimpleResponse]:
+        result = await self._call_route(request, response, route)
+        if not result.cacheable or sets_cookie(result):
+            return result
+        return await CacheEntry.from_response(result, route.cache_vary)
+
+    async def _route_entry(
+        self,
+        request: Request,
+        response: SimpleResponse,
+        route: Route,
+        key: typing.Optional[str] = None,
+    ) -> typing.Union[CacheEntry, SimpleResponse]:
+        """
+        run route and encode its result,
+        concurrent requests with the same single flight key share one run
+        :param request:
+        :param response:
+        :param route:
+        :param key: single flight key, route.single_flight makes it if not set
+        :return:
+        """
+        if key is None and route.single_flight is not None:
+            key = route.single_flight(request)
+        if key is None:
+            return await self._entry_from_route(request, response, route)
+
+        result, produced = await self.single_flight.do(
+            (route.path, key), lambda: self._entry_from_route(request, response, route)
+        )
+        if not produced and (
+            not isinstance(result, CacheEntry) or result.status_code == 499
+        ):
+            # not encoded response (stream, file) can't be shared,
+            # response of disconnected client is not for waiters
+            return await self._call_route(request, response, route)
+        return result
+
+    async def _cached_response(
+        self, request: Request, response: SimpleResponse, route: Route
+    ) -> SimpleResponse:
+        if self.cache_backend is None:
+            self.cache_backend = LocalCache()
+        key = make_cache_key(request, route.cache_vary)
+        entry = await self.cache_backend.get(key)
+        if entry is None:
+            # concurrent misses share one run of route func
+            result = await self._route_entry(request, response, route, key)
+            if not isinstance(result, CacheEntry):
+                return result
+            entry = result
+            if entry.status_code == 200:
+                await self.cache_backend.set(key, entry, route.cache_ttl)
+        return CachedResponse(entry, request.headers.get(b"if-none-match"))
 
     def create_route(
-        self, path: str, func: RouteFunc, methods: typing.Tuple[Method],
+        self,
+        path: str,
+        func: RouteFunc,
+        methods: typing.Tuple[Method],
+        response_class: typing.Optional[typing.Type[SimpleResponse]] = None,
+        cache: typing.Optional[float] = None,
+        cache_vary: typing.Iterable[str] = (),
+        single_flight: typing.Union[bool, typing.Callable[[Request], str]] = False,
+        executor: str = "thread",
+        limit: typing.Optional[ConcurrencyLimit] = None,
+        rate_limit: typing.Optional[RateLimiter] = None,
+        timeout: typing.Optional[float] = None,
+        cancel_on_disconnect: typing.Optional[bool] = None,
     ) -> typing.Optional[typing.NoReturn]:
         """
         create any method route for app
         :param path:
         :param func:
         :param methods:
+        :param response_class: class for wrapping route results,
+        if not set return annotation of func is used
+        :param cache: ttl in seconds for caching GET responses of route,
+        responses setting cookies are not cached
+        :param cache_vary: request headers which values are part of cache key,
+        they are sent in vary header
+        :param single_flight: concurrent requests with the same key share
+        one run of route func, True uses method, path, query and cache_vary
+        headers as key, or pass function making key from request.
+        cache misses of routes with cache ttl always share runs
+        :param executor: name of thread executor for sync route func
+        :param limit: ConcurrencyLimit() of route, requests over it get 503
+        :param rate_limit: RateLimiter() of route, requests over it get 429
+        :param timeout: seconds for route func, 504 is sent when it is exceeded,
+        handler_timeout of app by default, 0 disables it
+        :param cancel_on_disconnect: cancel route func when client disconnects,
+        cancel_on_disconnect of app by default
         :return:
         """
-        route = Route(path, func, methods=methods)
+        route = Route(path, func, methods=methods, response_class=response_class)
+        route.limit = limit
+        route.rate_limit = rate_limit
+        route.timeout = self.handler_timeout if timeout is None else timeout or None
+        route.cancel_on_disconnect = (
+            self.cancel_on_disconnect
+            if cancel_on_disconnect is None
+            else cancel_on_disconnect
+        )
+        route.cache_ttl = cache
+        route.cache_vary = tuple(cache_vary)
+        if single_flight is True:
+            route.single_flight = functools.partial(
+                make_cache_key, vary=route.cache_vary
+            )
+        elif single_flight:
+            route.single_flight = single_flight
 
         route_func_arg_count = route.func.__code__.co_argcount
 
@@ -150,72 +889,297 @@ class Kumquat:
             raise KumquatException(
                 f"function <<{func.__name__}>> must take strictly 2 args"
             )
+        if inspect.isasyncgenfunction(func):
+            route.func = _async_generator_handler(func)
+        elif not inspect.iscoroutinefunction(func):
+            route_executor = self.executors.get(executor)
+            if route_executor is None or route_executor.kind != "thread":
+                raise KumquatException(
+                    f"sync function <<{func.__name__}>> needs thread executor,"
+                    f" <<{executor}>> is not one"
+                )
+            route.func = _sync_handler(func, route_executor)
+        route.dispatcher = _compile_dispatcher(route)
         self.router.add_route(route)
         return None
 
-    def create_middleware(self, func: RouteFunc) -> None:
-        self.middleware_stack.append(func)
+    def create_websocket_route(
+        self, path: str, func: typing.Callable[[WebSocket], typing.Awaitable]
+    ) -> None:
+        """
+        create websocket route, func takes WebSocket
+        :param path:
+        :param func:
+        :return:
+        """
+        if not inspect.iscoroutinefunction(func):
+            raise KumquatException(
+                f"websocket function <<{func.__name__}>> must be async"
+            )
+        self.websocket_router.add_route(Route(path, func, methods=(WEBSOCKET,)))
+
+    def websocket(self, path: str) -> typing.Callable:
+        """
+        decorator for creating websocket route
+
+        @app.websocket("/ws/<room>")
+        async def room(websocket: WebSocket):
+            await websocket.accept()
+            ...
+        :param path:
+        :return:
+        """
+
+        def decorator(func: typing.Callable) -> typing.Callable:
+            self.create_websocket_route(path, func)
+            return func
+
+        return decorator
+
+    def _get_static_route(self, path: str) -> typing.Optional[Route]:
+        for route in self.static_routes:
+            if route.func.match(path):
+                return route
+        return None
+
+    def static(
+        self,
+        prefix: str,
+        directory: str,
+        cache_size: int = 0,
+        cache_max_file_size: int = 262144,
+        precompressed: bool = True,
+    ) -> None:
+        """
+        serve files from directory under path prefix (app.static("/static", "static/"))
+        :param prefix:
+        :param directory:
+        :param cache_size: count of small files kept in memory, 0 disables cache
+        :param cache_max_file_size: max size of file kept in memory
+        :param precompressed: send .br/.zst/.gz file near requested one if it exists
+        :return:
+        """
+        static_files = StaticFiles(
+            prefix,
+            directory,
+            cache_size=cache_size,
+            cache_max_file_size=cache_max_file_size,
+            precompressed=precompressed,
+        )
+        route = Route(
+            static_files.prefix or "/",
+            static_files,
+            methods=(Method("GET"), Method("HEAD")),
+        )
+        route.dispatcher = _compile_dispatcher(route)
+        self.static_routes.append(route)
 
-    def middleware(self) -> typing.Callable:
+    def create_middleware(
+        self, func: typing.Callable, phase: str = "after", blocking: bool = False
+    ) -> None:
+        """
+        create middleware for app
+        :param func:
+        :param phase: "before", "after" or "around" route func
+        :param blocking: run sync func in "thread" executor of app
+        :return:
+        """
+        self.middleware_stack.append(Middleware(func, phase=phase, blocking=blocking))
+        self._asgi_app = None
+
+    def middleware(
+        self, phase: str = "after", blocking: bool = False
+    ) -> typing.Callable:
         """
         decorator for creating middleware
+
+        @app.middleware()  # after response is produced
+        async def add_header(request, response): ...
+
+        @app.middleware("before")  # not None result is sent as response
+        async def auth(request, response): ...
+
+        @app.middleware("around")
+        async def timing(request, response, call_next):
+            return await call_next()
+        :param phase: "before", "after" or "around" route func
+        :param blocking: run sync func in "thread" executor of app
         :return:
         """
 
-        def decorator(func: RouteFunc) -> typing.Callable:
-            self.create_middleware(func)
+        def decorator(func: typing.Callable) -> typing.Callable:
+            self.create_middleware(func, phase=phase, blocking=blocking)
             return func
 
         return decorator
 
-    def get(self, path: str):
+    def add_asgi_middleware(self, middleware_class: typing.Callable, **options) -> None:
+        """
+        wrap app with pure asgi middleware, middleware_class(app, **options),
+        it gets scopes of all types (http, websocket, lifespan)
+        :param middleware_class:
+        :param options:
+        :return:
+        """
+        self.asgi_middleware.append((middleware_class, options))
+        self._asgi_app = None
+
+    def get(
+        self,
+        path: str,
+        response_class: typing.Optional[typing.Type[SimpleResponse]] = None,
+        cache: typing.Optional[float] = None,
+        cache_vary: typing.Iterable[str] = (),
+        single_flight: typing.Union[bool, typing.Callable[[Request], str]] = False,
+        executor: str = "thread",
+        limit: typing.Optional[ConcurrencyLimit] = None,
+        rate_limit: typing.Optional[RateLimiter] = None,
+        timeout: typing.Optional[float] = None,
+        cancel_on_disconnect: typing.Optional[bool] = None,
+    ):
         """
         decorator for creating get route
         :param path:
+        :param response_class:
+        :param cache: ttl of response cache in seconds
+        :param cache_vary: request headers which values are part of cache key
+        :param single_flight: share one run of route func between
+        concurrent identical requests
+        :param executor: name of thread executor for sync route func
+        :param limit: concurrency limit of route
+        :param rate_limit: rate limiter of route
+        :param timeout: timeout of route func in seconds (504)
+        :param cancel_on_disconnect: cancel route func when client disconnects
         :return:
         """
 
         def decorator(func: RouteFunc) -> typing.Callable:
-            self.create_route(path, func, methods=(Method("GET"),))
+            self.create_route(
+                path,
+                func,
+                methods=(Method("GET"),),
+                response_class=response_class,
+                cache=cache,
+                cache_vary=cache_vary,
+                single_flight=single_flight,
+                executor=executor,
+                limit=limit,
+                rate_limit=rate_limit,
+                timeout=timeout,
+                cancel_on_disconnect=cancel_on_disconnect,
+            )
             return func
 
         return decorator
 
-    def post(self, path: str):
+    def post(
+        self,
+        path: str,
+        response_class: typing.Optional[typing.Type[SimpleResponse]] = None,
+        executor: str = "thread",
+        limit: typing.Optional[ConcurrencyLimit] = None,
+        rate_limit: typing.Optional[RateLimiter] = None,
+        timeout: typing.Optional[float] = None,
+        cancel_on_disconnect: typing.Optional[bool] = None,
+    ):
         """
         decorator for creating post route
         :param path:
+        :param response_class:
+        :param executor: name of thread executor for sync route func
+        :param limit: concurrency limit of route
+        :param rate_limit: rate limiter of route
+        :param timeout: timeout of route func in seconds (504)
+        :param cancel_on_disconnect: cancel route func when client disconnects
         :return:
         """
 
         def decorator(func: RouteFunc) -> typing.Callable:
-            self.create_route(path, func, methods=(Method("POST"),))
+            self.create_route(
+                path,
+                func,
+                methods=(Method("POST"),),
+                response_class=response_class,
+                executor=executor,
+                limit=limit,
+                rate_limit=rate_limit,
+                timeout=timeout,
+                cancel_on_disconnect=cancel_on_disconnect,
+            )
             return func
 
         return decorator
 
-    def route(self, path: str, methods: typing.Tuple[Method]):
+    def route(
+        self,
+        path: str,
+        methods: typing.Tuple[Method],
+        response_class: typing.Optional[typing.Type[SimpleResponse]] = None,
+        cache: typing.Optional[float] = None,
+        cache_vary: typing.Iterable[str] = (),
+        single_flight: typing.Union[bool, typing.Callable[[Request], str]] = False,
+        executor: str = "thread",
+        limit: typing.Optional[ConcurrencyLimit] = None,
+        rate_limit: typing.Optional[RateLimiter] = None,
+        timeout: typing.Optional[float] = None,
+        cancel_on_disconnect: typing.Optional[bool] = None,
+    ):
         """
         decorator for creating any method route
         :param path:
         :param methods:
+        :param response_class:
+        :param cache: ttl of response cache in seconds (GET requests only)
+        :param cache_vary: request headers which values are part of cache key
+        :param single_flight: share one run of route func between
+        concurrent identical requests
+        :param executor: name of thread executor for sync route func
+        :param limit: concurrency limit of route
+        :param rate_limit: rate limiter of route
+        :param timeout: timeout of route func in seconds (504)
+        :param cancel_on_disconnect: cancel route func when client disconnects
         :return:
         """
 
         def decorator(func: RouteFunc) -> typing.Callable:
-            self.create_route(path, func, methods=methods)
+            self.create_route(
+                path,
+                func,
+                methods=methods,
+                response_class=response_class,
+                cache=cache,
+                cache_vary=cache_vary,
+                single_flight=single_flight,
+                executor=executor,
+                limit=limit,
+                rate_limit=rate_limit,
+                timeout=timeout,
+                cancel_on_disconnect=cancel_on_disconnect,
+            )
             return func
 
         return decorator
 
-    def index(self):
+    def index(
+        self,
+        response_class: typing.Optional[typing.Type[SimpleResponse]] = None,
+        cache: typing.Optional[float] = None,
+    ):
         """
         decorator for creating index route (path = '/')
+        :param response_class:
+        :param cache: ttl of response cache in seconds
         :return:
         """
 
         def decorator(func: RouteFunc) -> typing.Callable:
-            self.create_route("/", func, methods=(Method("GET"),))
+            self.create_route(
+                "/",
+                func,
+                methods=(Method("GET"),),
+                response_class=response_class,
+                cache=cache,
+            )
             return func
 
         return decorator
@@ -230,6 +1194,30 @@ class Kumquat:
         """
         uvicorn.run(self, host=host, port=port, log_level=log_level)
 
+    def serve(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int = 1,
+        log_level: str = "info",
+        **options,
+    ):
+        """
+        start application in production mode: several forked workers
+        sharing one socket, uvloop and httptools if they are installed
+        :param host:
+        :param port:
+        :param workers: count of worker processes
+        :param log_level:
+        :param options: backlog, keep_alive, limit_concurrency,
+        max_requests, max_requests_jitter, graceful_timeout, loop, http
+        (see kumquat.server.Server)
+        :return:
+        """
+        Server(
+            self, host=host, port=port, workers=workers, log_level=log_level, **options
+        ).run()
+
     def ngrok_run(self, port: int = 8000):
         if ngrok is None:
             raise ImportError(
@@ -0,0 +1,238 @@
+"""
+response cache with pluggable backends
+"""
+import hashlib
+import time
+import typing
+from collections import OrderedDict
+
+from kumquat._types import Scope, Receive, Send
+from kumquat.request import Request
+from kumquat.response import RawHeaders, SimpleResponse
+
+
+class CacheEntry:
+    """
+    encoded response saved in cache
+    """
+
+    __slots__ = ("status_code", "headers", "body", "etag")
+
+    def __init__(self, status_code: int, headers: RawHeaders, body: bytes, etag: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+
+    @classmethod
+    async def from_response(
+        cls, response: SimpleResponse, vary: typing.Iterable[str] = ()
+    ) -> "CacheEntry":
+        """
+        encode response
+        :param response:
+        :param vary: names of request headers response depends on
+        :return:
+        """
+        body = await response.render()
+        etag = b'"' + hashlib.blake2b(body, digest_size=16).hexdigest().encode() + b'"'
+        headers = [
+            (name, value)
+            for name, value in response._create_headers(body)
+            if name != b"content-length"
+        ]
+        if vary:
+            headers.append((b"vary", ", ".join(vary).encode("latin-1")))
+        return cls(response.status_code, headers, body, etag)
+
+    @property
+    def vary(self) -> RawHeaders:
+        return [(name, value) for name, value in self.headers if name == b"vary"]
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def dumps(self) -> bytes:
+        """
+        serialize entry to bytes for external stores
+        :return:
+        """
+        lines = [str(self.status_code).encode(), self.etag]
+        lines.extend(name + b":" + value for name, value in self.headers)
+        return b"\n".join(lines) + b"\n\n" + self.body
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CacheEntry":
+        head, _, body = data.partition(b"\n\n")
+        status_code, etag, *raw_headers = head.split(b"\n")
+        headers = [tuple(header.split(b":", 1)) for header in raw_headers]
+        return cls(int(status_code), headers, body, etag)  # type: ignore
+
+
+class CacheBackend:
+    """
+    base cache backend
+    """
+
+    async def get(self, key: str) -> typing.Optional[CacheEntry]:
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+
+class LocalCache(CacheBackend):
+    """
+    in-process cache with ttl, entries are evicted in lru order
+    when max_entries or max_size (bytes of bodies and headers) is exceeded
+    """
+
+    def __init__(self, max_entries: int = 1024, max_size: int = 67108864):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self._data: "OrderedDict[str, typing.Tuple[float, CacheEntry]]" = OrderedDict()
+
+    async def get(self, key: str) -> typing.Optional[CacheEntry]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at < time.monotonic():
+            self._pop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        if entry.size > self.max_size:
+            return None
+        self._pop(key)
+        self._data[key] = (time.monotonic() + ttl, entry)
+        self.size += entry.size
+        while len(self._data) > self.max_entries or self.size > self.max_size:
+            self._pop(next(iter(self._data)))
+        return None
+
+    def _pop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is not None:
+            self.size -= item[1].size
+
+    async def delete(self, key: str) -> None:
+        self._pop(key)
+
+    async def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+
+
+class RedisCache(CacheBackend):
+    """
+    cache in redis-compatible store,
+    client have to provide async get, set(key, value, px=ms), delete and
+    scan_iter (redis.asyncio.Redis, aioredis 2)
+    """
+
+    def __init__(self, client: typing.Any, prefix: str = "kumquat:cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> typing.Optional[CacheEntry]:
+        data = await self.client.get(self.prefix + key)
+        if data is None:
+            return None
+        return CacheEntry.loads(data)
+
+    async def set(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        await self.client.set(self.prefix + key, entry.dumps(), px=int(ttl * 1000))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+
+def sets_cookie(response: SimpleResponse) -> bool:
+    """
+    check if response sets cookies, it is personal and is not cached or shared
+    :param response:
+    :return:
+    """
+    return any(name.lower() == b"set-cookie" for name, _ in response._custom_headers)
+
+
+def make_cache_key(request: Request, vary: typing.Iterable[str] = ()) -> str:
+    """
+    cache key from method, path (path_dict is taken from it),
+    query string and values of vary headers
+    :param request:
+    :param vary:
+    :return:
+    """
+    query_string = request.query_string or ""
+    if isinstance(query_string, bytes):
+        query_string = query_string.decode("latin-1")
+    key = f"{request.method}:{request.path}?{query_string}"
+    if vary:
+        headers = request.headers
+        values = "|".join(
+            headers.get(name, b"").decode("latin-1") for name in vary
+        )
+        key = f"{key}#{values}"
+    return key
+
+
+class CachedResponse(SimpleResponse):
+    """
+    response sent from cache entry,
+    304 is sent if If-None-Match of request matches entry etag
+    """
+
+    def __init__(self, entry: CacheEntry, if_none_match: typing.Optional[bytes] = None):
+        super().__init__(entry.body, status_code=entry.status_code)
+        self.entry = entry
+        tags = (
+            [tag.strip() for tag in if_none_match.split(b",")] if if_none_match else []
+        )
+        # weak comparison, compression weakens etag of compressed responses
+        self.not_modified = (
+            b"*" in tags or entry.etag in tags or b"W/" + entry.etag in tags
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        entry = self.entry
+        if self.not_modified:
+            headers: RawHeaders = [(b"etag", entry.etag)]
+            headers.extend(entry.vary)
+            headers.extend(self._custom_headers)
+            await send(
+                {"type": "http.response.start", "status": 304, "headers": headers}
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return None
+
+        headers = [
+            (b"content-length", str(len(entry.body)).encode()),
+            (b"etag", entry.etag),
+        ]
+        headers.extend(entry.headers)
+        headers.extend(self._custom_headers)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": headers,
+            }
+        )
+        await send({"type": "http.response.body", "body": entry.body})
+        return None
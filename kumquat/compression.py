@@ -0,0 +1,360 @@
+"""
+response compression (gzip, brotli, zstd)
+"""
+import typing
+import zlib
+
+from kumquat._types import Message, Send
+from kumquat.exceptions import ExecutorRejected
+from kumquat.utils import BackgroundTask, Executor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Encoder:
+    """
+    base encoder, compress() is used for whole bodies,
+    compressor() for streamed ones
+    """
+
+    name = ""
+
+    def __init__(self, level: typing.Optional[int] = None):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def compressor(self) -> "StreamCompressor":
+        raise NotImplementedError
+
+
+class StreamCompressor:
+    def __init__(
+        self,
+        compress: typing.Callable[[bytes], bytes],
+        flush: typing.Callable[[], bytes],
+        finish: typing.Callable[[], bytes],
+    ):
+        self.compress = compress
+        self.flush = flush
+        self.finish = finish
+
+
+class GzipEncoder(Encoder):
+    name = "gzip"
+
+    def _compressobj(self):
+        level = self.level if self.level is not None else 6
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        compressobj = self._compressobj()
+        return compressobj.compress(data) + compressobj.flush()
+
+    def compressor(self) -> StreamCompressor:
+        compressobj = self._compressobj()
+        return StreamCompressor(
+            compressobj.compress,
+            lambda: compressobj.flush(zlib.Z_SYNC_FLUSH),
+            compressobj.flush,
+        )
+
+
+class BrotliEncoder(Encoder):
+    name = "br"
+
+    def _quality(self) -> int:
+        return self.level if self.level is not None else 4
+
+    def compress(self, data: bytes) -> bytes:
+        return brotli.compress(data, quality=self._quality())
+
+    def compressor(self) -> StreamCompressor:
+        compressor = brotli.Compressor(quality=self._quality())
+        return StreamCompressor(
+            compressor.process, compressor.flush, compressor.finish
+        )
+
+
+class ZstdEncoder(Encoder):
+    name = "zstd"
+
+    def _compressor(self):
+        level = self.level if self.level is not None else 3
+        return zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor().compress(data)
+
+    def compressor(self) -> StreamCompressor:
+        compressobj = self._compressor().compressobj()
+        return StreamCompressor(
+            compressobj.compress,
+            lambda: compressobj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressobj.flush,
+        )
+
+
+ENCODERS: typing.Dict[str, typing.Type[Encoder]] = {}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+ENCODERS["gzip"] = GzipEncoder
+
+SKIP_CONTENT_TYPES = (
+    b"image/",
+    b"video/",
+    b"audio/",
+    b"font/woff",
+    b"application/zip",
+    b"application/gzip",
+    b"application/x-gzip",
+    b"application/x-bzip2",
+    b"application/x-7z-compressed",
+    b"application/x-rar-compressed",
+    b"application/zstd",
+    b"application/octet-stream",
+)
+
+
+def negotiate(
+    accept_encoding: typing.Union[str, bytes], available: typing.Iterable[str]
+) -> typing.Optional[str]:
+    """
+    choose encoding from Accept-Encoding header,
+    the one with the highest q value, server order wins on equal values
+    :param accept_encoding:
+    :param available: encodings in server preference order
+    :return:
+    """
+    if isinstance(accept_encoding, bytes):
+        accept_encoding = accept_encoding.decode("latin-1")
+    weights: typing.Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    best: typing.Optional[str] = None
+    best_weight = 0.0
+    for name in available:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+def weak_etag(etag: bytes) -> bytes:
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+
+def add_vary(vary: bytes, name: bytes) -> bytes:
+    """
+    add header name to value of vary header if it is not there
+    :param vary:
+    :param name:
+    :return:
+    """
+    names = [item.strip().lower() for item in vary.split(b",")]
+    if name in names or b"*" in names:
+        return vary
+    return vary + b", " + name if vary.strip() else name
+
+
+class Compression:
+    """
+    compresses responses for clients accepting it
+
+    :param minimum_size: bodies smaller than this are sent as is
+    :param offload_size: bodies bigger than this are compressed
+    in "thread" executor of app
+    :param encodings: allowed encodings in preference order
+    :param level: compression level for all encoders
+    """
+
+    def __init__(
+        self,
+        minimum_size: int = 500,
+        offload_size: int = 262144,
+        encodings: typing.Iterable[str] = ("br", "zstd", "gzip"),
+        level: typing.Optional[int] = None,
+        skip_content_types: typing.Iterable[bytes] = SKIP_CONTENT_TYPES,
+    ):
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.encoders = {
+            name: ENCODERS[name](level) for name in encodings if name in ENCODERS
+        }
+        self.skip_content_types = tuple(skip_content_types)
+        # executor compressing big bodies, app sets its "thread" one
+        self.executor: typing.Optional[Executor] = None
+
+    def negotiate(
+        self, accept_encoding: typing.Union[str, bytes, None]
+    ) -> typing.Optional[Encoder]:
+        if not accept_encoding:
+            return None
+        name = negotiate(accept_encoding, self.encoders)
+        return self.encoders[name] if name is not None else None
+
+    def wrap_send(self, encoder: Encoder, send: Send) -> Send:
+        """
+        wrap ASGI send to compress response body with encoder
+        :param encoder:
+        :param send:
+        :return:
+        """
+        return CompressedSend(self, encoder, send)
+
+    def should_compress(self, message: Message) -> bool:
+        if message["status"] in (204, 206, 304):
+            return False
+        for name, value in message.get("headers") or ():
+            name = name.lower()
+            if name in (b"content-encoding", b"content-range"):
+                return False
+            if name == b"content-type" and value.lower().startswith(
+                self.skip_content_types
+            ):
+                return False
+            if name == b"content-length" and int(value) < self.minimum_size:
+                return False
+        return True
+
+
+class CompressedSend:
+    """
+    ASGI send compressing body messages,
+    start message is delayed until first body message
+    """
+
+    def __init__(self, compression: Compression, encoder: Encoder, send: Send):
+        self.compression = compression
+        self.encoder = encoder
+        self.send = send
+        self.start_message: typing.Optional[Message] = None
+        self.compressor: typing.Optional[StreamCompressor] = None
+        self.passthrough = False
+
+    def _start_headers(
+        self, start_message: Message
+    ) -> typing.List[typing.Tuple[bytes, bytes]]:
+        """
+        headers of compressed response: etag is weakened, compressed
+        and identity bodies are not byte-equal, accept-encoding is added to vary
+        :param start_message:
+        :return:
+        """
+        headers = []
+        vary_added = False
+        for name, value in start_message["headers"]:
+            name_lower = name.lower()
+            if name_lower == b"content-length":
+                continue
+            if name_lower == b"etag":
+                value = weak_etag(value)
+            elif name_lower == b"vary" and not vary_added:
+                value = add_vary(value, b"accept-encoding")
+                vary_added = True
+            headers.append((name, value))
+        headers.append((b"content-encoding", self.encoder.name.encode()))
+        if not vary_added:
+            headers.append((b"vary", b"accept-encoding"))
+        return headers
+
+    async def __call__(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            if self.compression.should_compress(message):
+                self.start_message = message
+            else:
+                if message["status"] == 304:
+                    # validators of 304 have to match the compressed response
+                    message["headers"] = [
+                        (name, weak_etag(value) if name.lower() == b"etag" else value)
+                        for name, value in message.get("headers") or ()
+                    ]
+                self.passthrough = True
+                await self.send(message)
+            return None
+
+        if self.passthrough or message_type != "http.response.body":
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+                self.passthrough = True
+            await self.send(message)
+            return None
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None and not more_body:
+            await self._send_whole(body)
+            return None
+
+        if self.compressor is None:
+            self.compressor = self.encoder.compressor()
+            start_message = self.start_message
+            start_message["headers"] = self._start_headers(start_message)
+            await self.send(start_message)
+            self.start_message = None
+
+        data = self.compressor.compress(body) if body else b""
+        if more_body:
+            data += self.compressor.flush()
+        else:
+            data += self.compressor.finish()
+        if data or not more_body:
+            await self.send(
+                {"type": "http.response.body", "body": data, "more_body": more_body}
+            )
+        return None
+
+    async def _compress_offloaded(self, body: bytes) -> bytes:
+        executor = self.compression.executor
+        try:
+            if executor is not None:
+                return await executor.run(self.encoder.compress, body)
+            return await BackgroundTask(self.encoder.compress, body)()
+        except ExecutorRejected:
+            # queue of executor is full, response is already being sent
+            return self.encoder.compress(body)
+
+    async def _send_whole(self, body: bytes) -> None:
+        start_message = self.start_message
+        self.start_message = None
+        if len(body) < self.compression.minimum_size:
+            await self.send(start_message)
+            await self.send({"type": "http.response.body", "body": body})
+            return None
+
+        if len(body) > self.compression.offload_size:
+            body = await self._compress_offloaded(body)
+        else:
+            body = self.encoder.compress(body)
+
+        headers = self._start_headers(start_message)
+        headers.append((b"content-length", str(len(body)).encode()))
+        start_message["headers"] = headers
+        await self.send(start_message)
+        await self.send({"type": "http.response.body", "body": body})
+        return None
@@ -1,6 +1,31 @@
 """
-context var for jinja2 templates path
+context vars for jinja2 templates environment, json codec and executors,
+app sets them for every scope it handles
 """
+import typing
 from contextvars import ContextVar
 
-env_var: ContextVar[str] = ContextVar("var")
+from kumquat.exceptions import KumquatException
+from kumquat.serialization import JSONCodec, get_codec
+from kumquat.templating import Templates
+
+templates_var: ContextVar[typing.Optional[Templates]] = ContextVar(
+    "templates", default=None
+)
+json_codec_var: ContextVar[JSONCodec] = ContextVar("json_codec", default=get_codec())
+# executors of app by name (kumquat.utils.Executor)
+executors_var: ContextVar[typing.Optional[typing.Dict[str, typing.Any]]] = ContextVar(
+    "executors", default=None
+)
+
+
+def get_templates() -> Templates:
+    """
+    templates of app handling current request
+    :raises KumquatException: called outside of app
+    :return:
+    """
+    templates = templates_var.get()
+    if templates is None:
+        raise KumquatException("templates are available only inside of app")
+    return templates
@@ -1,2 +1,56 @@
+import typing
+
+
 class KumquatException(Exception):
     pass
+
+
+class HTTPException(KumquatException):
+    """
+    exception which is converted to response with status code
+    """
+
+    def __init__(
+        self,
+        status_code: int,
+        detail: str = "",
+        headers: typing.Optional[typing.Dict[str, str]] = None,
+    ):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+
+class ExecutorRejected(HTTPException):
+    """
+    executor queue is full, converted to 503 response
+    """
+
+    def __init__(self, executor: str, retry_after: int = 1):
+        super().__init__(
+            503, "Service Unavailable", headers={"retry-after": str(retry_after)}
+        )
+        self.executor = executor
+
+
+class Overloaded(HTTPException):
+    """
+    concurrency limit is reached and request can't wait, converted to 503
+    """
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            503, "Service Unavailable", headers={"retry-after": str(retry_after)}
+        )
+
+
+class RateLimited(HTTPException):
+    """
+    client exceeded rate limit, converted to 429
+    """
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__(
+            429, "Too Many Requests", headers={"retry-after": str(retry_after)}
+        )
@@ -0,0 +1,149 @@
+"""
+request metrics in prometheus text format
+"""
+import bisect
+import typing
+
+from kumquat.response import TextResponse
+
+# seconds
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+PHASES = ("routing", "middleware", "handler", "render", "send", "total")
+
+
+class Histogram:
+    """
+    latency histogram, values are observed in nanoseconds
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: typing.Sequence[int]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: int) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> typing.List[int]:
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: typing.Any) -> str:
+    return ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+
+
+class MetricsResponse(TextResponse):
+    content_type = "text/plain; version=0.0.4"
+
+
+class Metrics:
+    """
+    per route request counters and latency histograms,
+    pass Metrics() to Kumquat(metrics=...) to enable them
+
+    :param buckets: upper bounds of histogram buckets in seconds
+    :param phases: measure routing, middleware, handler, render and send
+    separately, False records only total latency (lower overhead)
+    :param prefix: prefix of metric names
+    """
+
+    def __init__(
+        self,
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+        phases: bool = True,
+        prefix: str = "kumquat",
+    ):
+        self.buckets = tuple(sorted(buckets))
+        self._bounds = [int(bucket * 1e9) for bucket in self.buckets]
+        self.phases = phases
+        self.prefix = prefix
+        self.in_flight = 0
+        self.requests: typing.Dict[typing.Tuple[str, str, int], int] = {}
+        self.latency: typing.Dict[typing.Tuple[str, str], Histogram] = {}
+
+    def observe(self, route: str, phase: str, elapsed: int) -> None:
+        """
+        :param route: route path
+        :param phase:
+        :param elapsed: nanoseconds
+        :return:
+        """
+        histogram = self.latency.get((route, phase))
+        if histogram is None:
+            histogram = self.latency[(route, phase)] = Histogram(self._bounds)
+        histogram.observe(elapsed)
+
+    def count(self, route: str, method: str, status: int) -> None:
+        key = (route, method, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def render(self) -> str:
+        """
+        metrics in prometheus text exposition format
+        :return:
+        """
+        prefix = self.prefix
+        lines = [
+            f"# HELP {prefix}_requests_total Count of handled requests.",
+            f"# TYPE {prefix}_requests_total counter",
+        ]
+        for (route, method, status), value in sorted(self.requests.items()):
+            labels = _labels(route=route, method=method, status=status)
+            lines.append(f"{prefix}_requests_total{{{labels}}} {value}")
+
+        name = f"{prefix}_request_duration_seconds"
+        lines.append(f"# HELP {name} Request latency by route and phase.")
+        lines.append(f"# TYPE {name} histogram")
+        bounds = [repr(bucket) for bucket in self.buckets] + ["+Inf"]
+        for (route, phase), histogram in sorted(self.latency.items()):
+            labels = _labels(route=route, phase=phase)
+            for bound, value in zip(bounds, histogram.cumulative()):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {value}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum / 1e9}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        lines.append(f"# HELP {prefix}_requests_in_flight Requests being handled.")
+        lines.append(f"# TYPE {prefix}_requests_in_flight gauge")
+        lines.append(f"{prefix}_requests_in_flight {self.in_flight}")
+        return "\n".join(lines) + "\n"
+
+    def handler(self) -> typing.Callable:
+        """
+        route func for metrics endpoint
+        :return:
+        """
+
+        async def metrics(request, response):
+            return MetricsResponse(self.render())
+
+        return metrics
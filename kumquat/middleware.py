@@ -0,0 +1,157 @@
+"""
+middleware chain
+"""
+import inspect
+import typing
+
+from kumquat.exceptions import KumquatException
+from kumquat.request import Request
+from kumquat.response import SimpleResponse
+from kumquat.route import Route
+from kumquat.utils import BackgroundTask, Executor
+
+Handler = typing.Callable[
+    [Request, SimpleResponse, typing.Optional[Route]], typing.Awaitable[SimpleResponse]
+]
+CallNext = typing.Callable[..., typing.Awaitable[SimpleResponse]]
+
+PHASES = ("before", "after", "around")
+
+
+class Middleware:
+    """
+    app middleware
+
+    before - func(request, response), runs before route func,
+    if it returns not None value, it is sent as response (short-circuit)
+    after - func(request, response), runs after response is produced
+    around - func(request, response, call_next), await call_next() runs the rest
+    of the chain and returns response
+
+    sync funcs are called inline, blocking ones are run in thread executor
+    """
+
+    __slots__ = ("func", "phase", "blocking")
+
+    def __init__(
+        self, func: typing.Callable, phase: str = "after", blocking: bool = False
+    ):
+        if phase not in PHASES:
+            raise ValueError(f"middleware phase must be one of {PHASES}")
+        self.func = func
+        self.phase = phase
+        self.blocking = blocking
+
+    def as_async(
+        self, executor: typing.Optional[Executor] = None
+    ) -> typing.Callable[..., typing.Awaitable]:
+        """
+        coroutine function calling middleware func
+        :param executor: executor of blocking func, BackgroundTask if not set
+        :return:
+        """
+        func = self.func
+        if inspect.iscoroutinefunction(func):
+            return func
+        if self.blocking:
+
+            async def run_in_background(*args):
+                if executor is not None:
+                    return await executor.run(func, *args)
+                return await BackgroundTask(func, *args)()
+
+            return run_in_background
+
+        async def run(*args):
+            return func(*args)
+
+        return run
+
+    def __repr__(self):
+        return f'Middleware({self.func}, "{self.phase}")'
+
+
+def _after_layer(funcs: typing.List[typing.Callable], next_handler: Handler) -> Handler:
+    async def handler(
+        request: Request, response: SimpleResponse, route: typing.Optional[Route]
+    ) -> SimpleResponse:
+        result = await next_handler(request, response, route)
+        for func in funcs:
+            await func(request, result)
+        return result
+
+    return handler
+
+
+def _before_layer(
+    func: typing.Callable,
+    next_handler: Handler,
+    dispatch: typing.Callable[[typing.Any, SimpleResponse], SimpleResponse],
+) -> Handler:
+    async def handler(
+        request: Request, response: SimpleResponse, route: typing.Optional[Route]
+    ) -> SimpleResponse:
+        result = await func(request, response)
+        if result is not None:
+            return dispatch(result, response)
+        return await next_handler(request, response, route)
+
+    return handler
+
+
+def _around_layer(func: typing.Callable, next_handler: Handler) -> Handler:
+    async def handler(
+        request: Request, response: SimpleResponse, route: typing.Optional[Route]
+    ) -> SimpleResponse:
+        async def call_next(
+            next_request: Request = request, next_response: SimpleResponse = response
+        ) -> SimpleResponse:
+            return await next_handler(next_request, next_response, route)
+
+        return await func(request, response, call_next)
+
+    return handler
+
+
+def as_middleware(middleware: typing.Any) -> Middleware:
+    """
+    middleware object of middleware_stack entry, plain funcs are "after" ones,
+    sync funcs are blocking (it is how app called them before phases)
+    :param middleware:
+    :return:
+    """
+    if isinstance(middleware, Middleware):
+        return middleware
+    if not callable(middleware):
+        raise KumquatException(f"middleware <<{middleware!r}>> is not callable")
+    return Middleware(middleware, blocking=not inspect.iscoroutinefunction(middleware))
+
+
+def compile_chain(
+    middlewares: typing.Iterable[typing.Union[Middleware, typing.Callable]],
+    endpoint: Handler,
+    dispatch: typing.Callable[[typing.Any, SimpleResponse], SimpleResponse],
+    executor: typing.Optional[Executor] = None,
+) -> Handler:
+    """
+    build handler running middlewares around endpoint:
+    before and around ones in order of adding, then endpoint,
+    then after ones in order of adding (short-circuited responses too)
+    :param middlewares: Middleware objects or plain funcs (see as_middleware)
+    :param endpoint: handler producing response
+    :param dispatch: function converting short-circuit result to response
+    :param executor: executor of blocking middlewares
+    :return:
+    """
+    middlewares = [as_middleware(middleware) for middleware in middlewares]
+    handler = endpoint
+    for middleware in reversed(middlewares):
+        if middleware.phase == "before":
+            handler = _before_layer(middleware.as_async(executor), handler, dispatch)
+        elif middleware.phase == "around":
+            handler = _around_layer(middleware.as_async(executor), handler)
+
+    after = [m.as_async(executor) for m in middlewares if m.phase == "after"]
+    if after:
+        handler = _after_layer(after, handler)
+    return handler
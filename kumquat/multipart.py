@@ -0,0 +1,228 @@
+"""
+incremental multipart/form-data parser
+"""
+import asyncio
+import typing
+
+try:
+    from aiofile import AIOFile
+except ImportError:
+    AIOFile = None
+
+from kumquat.exceptions import HTTPException
+
+
+def parse_options_header(value: str) -> typing.Tuple[str, typing.Dict[str, str]]:
+    """
+    parse header like 'form-data; name="file"; filename="a.png"'
+    :param value:
+    :return: value and dict of options
+    """
+    main_value, *params = value.split(";")
+    options: typing.Dict[str, str] = {}
+    for param in params:
+        key, separator, option = param.strip().partition("=")
+        if not separator:
+            continue
+        option = option.strip()
+        if len(option) >= 2 and option[0] == option[-1] == '"':
+            option = option[1:-1].replace('\\"', '"')
+        options[key.strip().lower()] = option
+    return main_value.strip().lower(), options
+
+
+class Part:
+    """
+    part of multipart body, its data have to be consumed
+    before next part is read (not consumed data is skipped)
+    """
+
+    def __init__(self, reader: "MultipartReader", headers: typing.Dict[str, str]):
+        self._reader = reader
+        self.headers = headers
+        disposition, options = parse_options_header(
+            headers.get("content-disposition", "")
+        )
+        self.disposition = disposition
+        self.name: typing.Optional[str] = options.get("name")
+        self.filename: typing.Optional[str] = options.get("filename")
+        self.content_type = headers.get("content-type", "text/plain")
+        self.size = 0
+        self._consumed = False
+
+    def __repr__(self):
+        return f'Part("{self.name}", filename="{self.filename}")'
+
+    @property
+    def is_file(self) -> bool:
+        return self.filename is not None
+
+    async def stream(self) -> typing.AsyncIterator[bytes]:
+        """
+        iterate over part data chunks as they arrive
+        :return:
+        """
+        if self._consumed:
+            raise RuntimeError("Part consumed")
+        self._consumed = True
+        async for chunk in self._reader._read_part_data():
+            self.size += len(chunk)
+            yield chunk
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.stream()])
+
+    async def text(self, charset: str = "utf-8") -> str:
+        return (await self.read()).decode(charset)
+
+    async def save_to(
+        self, sink: typing.Callable[[bytes], typing.Awaitable[typing.Any]]
+    ) -> int:
+        """
+        send part data to async sink by chunks
+        :param sink: async callable taking chunk
+        :return: part size
+        """
+        async for chunk in self.stream():
+            await sink(chunk)
+        return self.size
+
+    async def save(self, path: str) -> int:
+        """
+        write part data to file by chunks
+        :param path:
+        :return: part size
+        """
+        if AIOFile is not None:
+            async with AIOFile(path, "wb") as file:
+                offset = 0
+                async for chunk in self.stream():
+                    await file.write(chunk, offset)
+                    offset += len(chunk)
+                await file.fsync()
+            return self.size
+
+        loop = asyncio.get_running_loop()
+        with open(path, "wb") as sync_file:
+            async for chunk in self.stream():
+                await loop.run_in_executor(None, sync_file.write, chunk)
+        return self.size
+
+
+class MultipartReader:
+    """
+    multipart/form-data reader working over body chunks stream,
+    parts are yielded as soon as their headers arrive
+
+    async for part in request.multipart():
+        if part.is_file:
+            await part.save(f"uploads/{part.filename}")
+        else:
+            value = await part.text()
+    """
+
+    def __init__(
+        self,
+        chunks: typing.AsyncIterator[bytes],
+        boundary: bytes,
+        max_part_size: typing.Optional[int] = None,
+        max_header_size: int = 16384,
+    ):
+        self._chunks = chunks
+        self._delimiter = b"\r\n--" + boundary
+        self.max_part_size = max_part_size
+        self.max_header_size = max_header_size
+        # preamble is skipped as data of part before first delimiter
+        self._buffer = bytearray(b"\r\n")
+        self._current: typing.Optional[Part] = None
+        self._part_finished = True
+        self._started = False
+        self._finished = False
+
+    async def _fill(self) -> bool:
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return False
+        self._buffer.extend(chunk)
+        return True
+
+    async def _read_part_data(self) -> typing.AsyncIterator[bytes]:
+        delimiter = self._delimiter
+        keep = len(delimiter) - 1
+        size = 0
+        while True:
+            index = self._buffer.find(delimiter)
+            if index != -1:
+                data = bytes(self._buffer[:index])
+                del self._buffer[: index + len(delimiter)]
+            elif len(self._buffer) > keep:
+                data = bytes(self._buffer[: len(self._buffer) - keep])
+                del self._buffer[: len(self._buffer) - keep]
+            else:
+                data = b""
+
+            if data:
+                size += len(data)
+                if self.max_part_size is not None and size > self.max_part_size:
+                    raise HTTPException(413, "Multipart Part Too Large")
+                yield data
+            if index != -1:
+                self._part_finished = True
+                return
+            if not await self._fill():
+                raise HTTPException(400, "Malformed Multipart Body")
+
+    async def _read_headers(self) -> typing.Dict[str, str]:
+        while True:
+            index = self._buffer.find(b"\r\n\r\n")
+            if index != -1:
+                break
+            if len(self._buffer) > self.max_header_size:
+                raise HTTPException(413, "Multipart Headers Too Large")
+            if not await self._fill():
+                raise HTTPException(400, "Malformed Multipart Body")
+        raw_headers = bytes(self._buffer[:index]).decode("utf-8", "replace")
+        del self._buffer[: index + 4]
+
+        headers: typing.Dict[str, str] = {}
+        for line in raw_headers.split("\r\n"):
+            key, separator, value = line.partition(":")
+            if separator:
+                headers[key.strip().lower()] = value.strip()
+        return headers
+
+    async def next_part(self) -> typing.Optional[Part]:
+        """
+        get next part, data of previous part is skipped if it is not consumed
+        :return: None after last part
+        """
+        if self._finished:
+            return None
+        if not self._part_finished:
+            async for _ in self._read_part_data():
+                pass
+        if not self._started:
+            self._started = True
+            async for _ in self._read_part_data():
+                pass
+
+        while len(self._buffer) < 2:
+            if not await self._fill():
+                raise HTTPException(400, "Malformed Multipart Body")
+        if self._buffer[:2] == b"--":
+            self._finished = True
+            return None
+
+        self._part_finished = False
+        self._current = Part(self, await self._read_headers())
+        return self._current
+
+    def __aiter__(self) -> "MultipartReader":
+        return self
+
+    async def __anext__(self) -> Part:
+        part = await self.next_part()
+        if part is None:
+            raise StopAsyncIteration
+        return part
@@ -0,0 +1,224 @@
+"""
+sampling profiler for requests
+"""
+import asyncio
+import collections
+import cProfile
+import inspect
+import io
+import json
+import os
+import pstats
+import random
+import time
+import traceback
+import typing
+
+from kumquat.utils import BackgroundTask, Executor
+
+ProfileCallback = typing.Callable[[typing.Dict[str, typing.Any]], typing.Any]
+
+
+def _await_stack(coro: typing.Any) -> str:
+    """
+    format chain of awaited coroutines, task.get_stack() has only
+    the outermost frame of suspended coroutine
+    :param coro:
+    :return:
+    """
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            frame = getattr(coro, "gi_frame", None)
+        if frame is not None:
+            frames.append(
+                (frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name, None)
+            )
+        coro = (
+            getattr(coro, "cr_await", None)
+            or getattr(coro, "ag_await", None)
+            or getattr(coro, "gi_yieldfrom", None)
+        )
+    return "".join(traceback.format_list(frames))
+
+
+class Profile:
+    """
+    profiling state of one request
+    """
+
+    __slots__ = ("started", "profiler", "task", "handle", "stacks")
+
+    def __init__(self):
+        self.started = time.time()
+        self.profiler: typing.Optional[cProfile.Profile] = None
+        self.task: typing.Optional[asyncio.Task] = None
+        self.handle: typing.Optional[asyncio.TimerHandle] = None
+        self.stacks: typing.Optional[typing.Counter[str]] = None
+
+
+class Profiler:
+    """
+    profile sampled part of requests with cProfile and requests running
+    longer than slow_threshold with stack sampler, reports have timings
+    of request phases (routing, middleware, handler, render, send)
+
+    cProfile sees everything running in event loop while request is handled,
+    only one request is profiled by it at once.
+    stack sampler looks at await stack of request task every interval seconds
+    after slow_threshold is reached, not sampled requests which are
+    faster than it only cost one timer.
+
+    :param sample_rate: part of requests profiled with cProfile (0..1)
+    :param slow_threshold: seconds, None disables stack sampler
+    :param interval: seconds between stack samples
+    :param directory: reports are written here as json files
+    :param max_files: count of reports kept in directory, older are removed
+    :param callback: func(report), sync or async, is called for each report
+    :param top: count of functions in cProfile report
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        slow_threshold: typing.Optional[float] = None,
+        interval: float = 0.005,
+        directory: typing.Optional[str] = None,
+        max_files: int = 100,
+        callback: typing.Optional[ProfileCallback] = None,
+        top: int = 30,
+    ):
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.interval = interval
+        self.directory = directory
+        self.max_files = max_files
+        self.callback = callback
+        self.top = top
+        self._profiling = False
+        # executor writing reports, app sets its "thread" one
+        self.executor: typing.Optional[Executor] = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def start(self) -> typing.Optional[Profile]:
+        """
+        start profiling current request if it is sampled or can be slow
+        :return: None if request is not profiled
+        """
+        sampled = (
+            self.sample_rate
+            and not self._profiling
+            and random.random() < self.sample_rate
+        )
+        if not sampled and self.slow_threshold is None:
+            return None
+
+        profile = Profile()
+        if sampled:
+            self._profiling = True
+            profile.profiler = cProfile.Profile()
+            profile.profiler.enable()
+        elif self.slow_threshold is not None:
+            profile.task = asyncio.current_task()
+            profile.handle = asyncio.get_running_loop().call_later(
+                self.slow_threshold, self._sample, profile
+            )
+        return profile
+
+    def _sample(self, profile: Profile) -> None:
+        if profile.task is None or profile.task.done():
+            return None
+        if profile.stacks is None:
+            profile.stacks = collections.Counter()
+        profile.stacks[_await_stack(profile.task.get_coro())] += 1
+        profile.handle = asyncio.get_running_loop().call_later(
+            self.interval, self._sample, profile
+        )
+        return None
+
+    async def finish(
+        self,
+        profile: Profile,
+        request: typing.Any,
+        route: str,
+        status: int,
+        timings: typing.Dict[str, int],
+    ) -> None:
+        """
+        stop profiling and report request if it was sampled or slow
+        :param profile:
+        :param request:
+        :param route:
+        :param status:
+        :param timings: phase timings in nanoseconds
+        :return:
+        """
+        if profile.handle is not None:
+            profile.handle.cancel()
+        report: typing.Dict[str, typing.Any] = {
+            "time": profile.started,
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": status,
+            "timings_ms": {
+                phase: elapsed / 1e6 for phase, elapsed in timings.items()
+            },
+        }
+        if profile.profiler is not None:
+            profile.profiler.disable()
+            self._profiling = False
+            stream = io.StringIO()
+            stats = pstats.Stats(profile.profiler, stream=stream)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            report["reason"] = "sampled"
+            report["profile"] = stream.getvalue()
+        elif profile.stacks is not None:
+            report["reason"] = "slow"
+            report["stacks"] = [
+                {"count": count, "stack": stack}
+                for stack, count in profile.stacks.most_common()
+            ]
+        elif (
+            self.slow_threshold is not None
+            and timings.get("total", 0) / 1e9 >= self.slow_threshold
+        ):
+            report["reason"] = "slow"
+            report["stacks"] = []
+        else:
+            return None
+        await self.report(report)
+
+    async def report(self, report: typing.Dict[str, typing.Any]) -> None:
+        if self.directory is not None:
+            if self.executor is not None:
+                await self.executor.run(self.write, report)
+            else:
+                await BackgroundTask(self.write, report)()
+        if self.callback is not None:
+            result = self.callback(report)
+            if inspect.isawaitable(result):
+                await result
+
+    def write(self, report: typing.Dict[str, typing.Any]) -> str:
+        """
+        write report to directory and remove the oldest ones over max_files
+        :param report:
+        :return: path of report file
+        """
+        name = f"{time.time_ns()}-{os.getpid()}-{report['reason']}.json"
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+        reports = sorted(
+            entry for entry in os.listdir(self.directory) if entry.endswith(".json")
+        )
+        for entry in reports[: max(len(reports) - self.max_files, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, entry))
+            except FileNotFoundError:
+                pass
+        return path
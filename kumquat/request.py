@@ -1,48 +1,250 @@
 """
 request schema
 """
+import asyncio
+import tempfile
 import typing
 import urllib.parse
 from collections import namedtuple
 
-from kumquat._types import Scope, Receive
+from kumquat._types import Message, Scope, Receive
+from kumquat.context import json_codec_var
+from kumquat.exceptions import HTTPException
+from kumquat.multipart import MultipartReader, parse_options_header
 
 _server = namedtuple("server", ["host", "port"])
 _client = namedtuple("client", ["host", "port"])
 
+_NOT_LOADED = object()
+
+
+class Headers(typing.Mapping[typing.Union[str, bytes], bytes]):
+    """
+    case-insensitive request headers,
+    keys can be str or bytes, values are raw bytes.
+    lookup dict is built on first access
+    """
+
+    __slots__ = ("raw", "_dict")
+
+    def __init__(self, raw: typing.Iterable[typing.Tuple[bytes, bytes]]):
+        self.raw = raw
+        self._dict: typing.Optional[typing.Dict[bytes, bytes]] = None
+
+    @property
+    def _headers(self) -> typing.Dict[bytes, bytes]:
+        if self._dict is None:
+            self._dict = {key.lower(): value for key, value in self.raw}
+        return self._dict
+
+    @staticmethod
+    def _key(key: typing.Union[str, bytes]) -> bytes:
+        if isinstance(key, str):
+            key = key.encode("latin-1")
+        return key.lower()
+
+    def __getitem__(self, key: typing.Union[str, bytes]) -> bytes:
+        return self._headers[self._key(key)]
+
+    def __contains__(self, key: typing.Any) -> bool:
+        if not isinstance(key, (str, bytes)):
+            return False
+        return self._key(key) in self._headers
+
+    def __iter__(self) -> typing.Iterator[bytes]:
+        return iter(self._headers)
+
+    def __len__(self) -> int:
+        return len(self._headers)
+
+    def getlist(self, key: typing.Union[str, bytes]) -> typing.List[bytes]:
+        """
+        get all values of repeated header
+        :param key:
+        :return:
+        """
+        key = self._key(key)
+        return [value for name, value in self.raw if name.lower() == key]
+
+    def __repr__(self):
+        return f"Headers({self._headers})"
+
 
 class Request:
     """
     request data class
+
+    everything except path and method is computed from scope on first access
     """
 
+    __slots__ = (
+        "_scope",
+        "_receive",
+        "method",
+        "path",
+        "_path_dict",
+        "_query",
+        "_headers",
+        "_cookies",
+        "_server",
+        "_client",
+        "_stream_consumed",
+        "_is_disconnected",
+        "_watching",
+        "_receive_task",
+        "max_body_size",
+        "spool_threshold",
+        "_bytes",
+        "_file",
+        "_form",
+        "_json",
+    )
+
     charset = "utf-8"
 
-    def __init__(self, scope: Scope, receive: Receive):
+    def __init__(
+        self,
+        scope: Scope,
+        receive: Receive,
+        max_body_size: typing.Optional[int] = None,
+        spool_threshold: int = 1048576,
+    ):
+        """
+        :param scope:
+        :param receive:
+        :param max_body_size: max size of body in bytes, bigger bodies get 413
+        :param spool_threshold: body bigger than this is spooled to disk in file()
+        """
+        self._scope = scope
         self._receive = receive
-        self._body: typing.Dict[str, str] = {}
+        self.max_body_size = max_body_size
+        self.spool_threshold = spool_threshold
+        self._bytes: typing.Optional[bytes] = None
+        self._file: typing.Optional[typing.IO[bytes]] = None
+        self._form: typing.Optional[typing.Dict[str, str]] = None
+        self._json: typing.Any = _NOT_LOADED
 
-        self._type = scope.get("type")
-        self.http_version = scope.get("http_version")
-        self.server = _server(scope["server"][0], scope["server"][1])
-        self.client = _client(scope["client"][0], scope["client"][1])
-        self.scheme = scope.get("scheme")
         self.method = scope.get("method")
-        self.root_path = scope.get("root_path")
-        self.path = scope["path"].rstrip("/") if scope["path"] != "/" else scope["path"]
+        path = scope["path"]
+        self.path = path.rstrip("/") if path != "/" else path
         self._path_dict: typing.Dict[str, str] = {}
-        self.raw_path = scope.get("raw_path")
-        self.query_string = scope.get("query_string")
-        self.query: typing.Dict[str, str] = {}
-        if self.query_string:
-            self.query_string = self.query_string.decode(self.charset)
-            self.query = dict(
-                urllib.parse.parse_qsl(self.query_string, encoding=self.charset)
-            )
-
-        self.headers = dict(scope["headers"])
+        self._query: typing.Optional[typing.Dict[str, str]] = None
+        self._headers: typing.Optional[Headers] = None
+        self._cookies: typing.Optional[typing.Dict[str, str]] = None
+        self._server: typing.Optional[_server] = None
+        self._client: typing.Optional[_client] = None
         self._stream_consumed = False
         self._is_disconnected = False
+        self._watching = False
+        self._receive_task: typing.Optional[asyncio.Future] = None
+
+    @property
+    def scope(self) -> Scope:
+        return self._scope
+
+    @property
+    def app(self) -> typing.Any:
+        return self._scope.get("app")
+
+    @property
+    def state(self) -> typing.Any:
+        """
+        state of app with shared resources opened in startup hooks
+        :return:
+        """
+        return self._scope["app"].state
+
+    @property
+    def _type(self) -> typing.Optional[str]:
+        return self._scope.get("type")
+
+    @property
+    def http_version(self) -> typing.Optional[str]:
+        return self._scope.get("http_version")
+
+    @property
+    def scheme(self) -> typing.Optional[str]:
+        return self._scope.get("scheme")
+
+    @property
+    def root_path(self) -> typing.Optional[str]:
+        return self._scope.get("root_path")
+
+    @property
+    def raw_path(self) -> typing.Optional[bytes]:
+        return self._scope.get("raw_path")
+
+    @property
+    def server(self) -> typing.Optional[_server]:
+        if self._server is None:
+            server = self._scope.get("server")
+            if server is not None:
+                self._server = _server(server[0], server[1])
+        return self._server
+
+    @property
+    def client(self) -> typing.Optional[_client]:
+        if self._client is None:
+            client = self._scope.get("client")
+            if client is not None:
+                self._client = _client(client[0], client[1])
+        return self._client
+
+    @property
+    def query_string(self) -> typing.Union[str, bytes, None]:
+        """
+        decoded query string
+        :return:
+        """
+        query_string = self._scope.get("query_string")
+        if query_string:
+            return query_string.decode(self.charset)
+        return query_string
+
+    @property
+    def query(self) -> typing.Dict[str, str]:
+        """
+        dict of query params, parsed on first access
+        :return:
+        """
+        if self._query is None:
+            query_string = self.query_string
+            if query_string:
+                self._query = dict(
+                    urllib.parse.parse_qsl(query_string, encoding=self.charset)
+                )
+            else:
+                self._query = {}
+        return self._query
+
+    @property
+    def headers(self) -> Headers:
+        """
+        case-insensitive headers, header["Content-Type"] == header[b"content-type"]
+        :return:
+        """
+        if self._headers is None:
+            self._headers = Headers(self._scope.get("headers") or [])
+        return self._headers
+
+    @property
+    def cookies(self) -> typing.Dict[str, str]:
+        """
+        dict of request cookies, parsed on first access
+        :return:
+        """
+        if self._cookies is None:
+            cookies: typing.Dict[str, str] = {}
+            for header in self.headers.getlist(b"cookie"):
+                for chunk in header.decode("latin-1").split(";"):
+                    key, separator, value = chunk.partition("=")
+                    if not separator:
+                        continue
+                    key, value = key.strip(), value.strip()
+                    if key:
+                        cookies[key] = urllib.parse.unquote(value.strip('"'))
+            self._cookies = cookies
+        return self._cookies
 
     async def _stream(self) -> typing.AsyncGenerator[bytes, None]:
         if self._stream_consumed:
@@ -62,17 +264,210 @@ class Request:
                 raise RuntimeError("Client disconnected")
         yield b""
 
-    async def body(self):
-        if not self._body:
-            async for part in self._stream():
-                self._body.update(
-                    dict(
-                        urllib.parse.parse_qsl(
-                            part.decode(self.charset), encoding=self.charset
-                        )
-                    )
+    async def is_disconnected(self) -> bool:
+        """
+        check without blocking if client disconnected,
+        for cooperative checks in long loops of route func.
+        empty body is read if it is not read yet, disconnect of request
+        with not read body is noticed only by disconnect watcher
+        :return:
+        """
+        if self._is_disconnected or self._watching:
+            return self._is_disconnected
+        if not self._stream_consumed:
+            if self._has_body():
+                return False
+            try:
+                await self.bytes()
+            except RuntimeError:
+                if self._is_disconnected:
+                    return True
+                raise
+
+        if self._receive_task is None:
+            # receive is left waiting between checks,
+            # disconnect is noticed by later check if it does not come at once
+            self._receive_task = asyncio.ensure_future(self._receive())
+            await asyncio.sleep(0)
+        if self._receive_task.done():
+            message = self._receive_task.result()
+            self._receive_task = None
+            if message["type"] == "http.disconnect":
+                self._is_disconnected = True
+        return self._is_disconnected
+
+    async def receive(self) -> Message:
+        """
+        receive asgi message after request is handled,
+        message waited by is_disconnected() is not lost
+        :return:
+        """
+        if self._receive_task is not None:
+            receive_task, self._receive_task = self._receive_task, None
+            return await receive_task
+        if self._is_disconnected:
+            return {"type": "http.disconnect"}
+        return await self._receive()
+
+    def _has_body(self) -> bool:
+        content_length = self.headers.get(b"content-length")
+        if content_length is not None:
+            return content_length not in (b"0", b"")
+        return b"transfer-encoding" in self.headers
+
+    def watch_disconnect(self, task: asyncio.Future) -> asyncio.Future:
+        """
+        cancel task when client disconnects. watcher becomes the only reader
+        of receive, body messages are passed to request stream through queue
+        (one message at once, so flow control of big bodies is kept)
+        :param task: task of route func
+        :return: watcher task, it has to be cancelled when task is done
+        """
+        receive = self._receive
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+        async def receive_rest() -> typing.Dict[str, typing.Any]:
+            if not queue.empty():
+                return queue.get_nowait()
+            return await receive()
+
+        async def watch() -> None:
+            try:
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        self._is_disconnected = True
+                        task.cancel()
+                        return None
+                    await queue.put(message)
+            finally:
+                self._watching = False
+                self._receive = receive_rest
+
+        self._watching = True
+        self._receive = queue.get
+        return asyncio.ensure_future(watch())
+
+    async def stream(
+        self, max_size: typing.Optional[int] = None
+    ) -> typing.AsyncIterator[bytes]:
+        """
+        iterate over raw body chunks as they arrive, body is not saved
+
+        :param max_size: max body size, default is max_body_size of request
+        :raises HTTPException: 413 if body is bigger than max_size
+        :return:
+        """
+        if max_size is None:
+            max_size = self.max_body_size
+        if max_size is not None:
+            content_length = self.headers.get(b"content-length")
+            if content_length is not None and content_length.isdigit():
+                if int(content_length) > max_size:
+                    raise HTTPException(413, "Payload Too Large")
+
+        received = 0
+        async for chunk in self._stream():
+            if not chunk:
+                continue
+            received += len(chunk)
+            if max_size is not None and received > max_size:
+                raise HTTPException(413, "Payload Too Large")
+            yield chunk
+
+    async def file(self, max_size: typing.Optional[int] = None) -> typing.IO[bytes]:
+        """
+        read body to SpooledTemporaryFile, it is kept in memory
+        until spool_threshold and written to disk after.
+        file is closed after response is sent
+        :param max_size:
+        :return:
+        """
+        if self._file is None:
+            spooled_file = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold)
+            try:
+                if self._bytes is not None:
+                    spooled_file.write(self._bytes)
+                else:
+                    async for chunk in self.stream(max_size):
+                        spooled_file.write(chunk)
+            except BaseException:
+                spooled_file.close()
+                raise
+            self._file = spooled_file
+        self._file.seek(0)
+        return self._file
+
+    async def form(self) -> typing.Dict[str, str]:
+        """
+        form-urlencoded body, parsed once
+        :return:
+        """
+        if self._form is None:
+            self._form = dict(
+                urllib.parse.parse_qsl(
+                    (await self.bytes()).decode(self.charset), encoding=self.charset
                 )
-        return self._body
+            )
+        return self._form
+
+    async def json(self) -> typing.Any:
+        """
+        json body, parsed once
+        :return:
+        """
+        if self._json is _NOT_LOADED:
+            body = await self.bytes()
+            try:
+                self._json = json_codec_var.get().loads(body) if body else None
+            except ValueError:
+                raise HTTPException(400, "Invalid JSON")
+        return self._json
+
+    def multipart(
+        self,
+        max_part_size: typing.Optional[int] = None,
+        max_size: typing.Optional[int] = None,
+    ) -> MultipartReader:
+        """
+        incremental multipart/form-data reader, parts are read from body stream
+        as they arrive, so files are not buffered in memory
+
+        :param max_part_size: max size of one part, bigger parts get 413
+        :param max_size: max body size, default is max_body_size of request
+        :raises HTTPException: 400 if body is not multipart
+        :return:
+        """
+        content_type, options = parse_options_header(
+            self.headers.get(b"content-type", b"").decode("latin-1")
+        )
+        boundary = options.get("boundary")
+        if content_type != "multipart/form-data" or not boundary:
+            raise HTTPException(400, "Expected multipart/form-data body")
+        return MultipartReader(
+            self.stream(max_size),
+            boundary.encode("latin-1"),
+            max_part_size=max_part_size,
+        )
+
+    async def body(self) -> typing.Dict[str, str]:
+        """
+        form-urlencoded body (same as form())
+        :return:
+        """
+        return await self.form()
+
+    def close(self) -> None:
+        """
+        close spooled body file
+        :return:
+        """
+        if self._receive_task is not None:
+            self._receive_task.cancel()
+            self._receive_task = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
 
     @property
     def path_dict(self) -> dict:
@@ -85,3 +480,20 @@ class Request:
     @path_dict.setter
     def path_dict(self, value) -> None:
         self._path_dict = value
+
+    # defined last, it shadows builtin bytes in class namespace
+    async def bytes(self, max_size: typing.Optional[int] = None) -> bytes:
+        """
+        whole body as bytes, read once
+
+        :param max_size: max body size, default is max_body_size of request
+        :raises HTTPException: 413 if body is bigger than max_size
+        :return:
+        """
+        if self._bytes is None:
+            if self._file is not None:
+                self._file.seek(0)
+                self._bytes = self._file.read()
+            else:
+                self._bytes = b"".join([chunk async for chunk in self.stream(max_size)])
+        return self._bytes
@@ -1,10 +1,12 @@
 """
 response schema
 """
-import json
+import asyncio
+import mimetypes
+import os
 import typing
-
-import jinja2
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
 
 try:
     from aiofile import AIOFile
@@ -12,14 +14,39 @@ except ImportError:
     AIOFile = None
 
 from kumquat._types import Scope, Receive, Send
-from kumquat.context import env_var
+from kumquat.context import get_templates, json_codec_var
 
-try:
-    import ujson
-except ImportError:
-    ujson = None
 
-JSON = json if ujson is None else ujson
+RawHeaders = typing.List[typing.Tuple[bytes, bytes]]
+Headers = typing.Union[
+    typing.Dict[str, str], typing.List[typing.Dict[str, str]], RawHeaders
+]
+
+# end of sync iterator read in thread
+_END = object()
+
+
+def encode_headers(headers: typing.Optional[Headers], charset: str) -> RawHeaders:
+    """
+    convert headers (dict, list of dicts or list of byte pairs)
+    to flat list of encoded byte pairs
+    :param headers:
+    :param charset:
+    :return:
+    """
+    if not headers:
+        return []
+    if isinstance(headers, dict):
+        headers = [headers]
+
+    raw_headers: RawHeaders = []
+    for header in headers:
+        if isinstance(header, dict):
+            for k, v in header.items():
+                raw_headers.append((k.encode(charset), v.encode(charset)))
+        else:
+            raw_headers.append((header[0], header[1]))
+    return raw_headers
 
 
 class SimpleResponse:
@@ -29,39 +56,48 @@ class SimpleResponse:
 
     charset = "utf-8"
     content_type = "text/plain"
+    content_type_header = b"text/plain; charset=utf-8"
+    # whole body can be produced before sending (response caching)
+    cacheable = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.content_type_header = f"{cls.content_type}; charset={cls.charset}".encode(
+            cls.charset
+        )
 
     def __init__(
-        self,
-        body: typing.Any,
-        headers: typing.List[typing.Dict[str, str]] = None,
-        status_code: int = 200,
+        self, body: typing.Any, headers: Headers = None, status_code: int = 200,
     ):
         self.body = body
         self._status_code = status_code
-        self._custom_headers = headers
+        self._custom_headers = encode_headers(headers, self.charset) if headers else []
+        self._encoded_body: typing.Optional[bytes] = None
+        self._encoded_source: typing.Any = None
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        body = self.parse_body()
         await send(
             {
                 "type": "http.response.start",
                 "status": self.status_code,
-                "headers": self._create_headers(),
+                "headers": self._create_headers(body),
             }
         )
-        await send({"type": "http.response.body", "body": self.parse_body()})
+        await send({"type": "http.response.body", "body": body})
 
     @property
-    def custom_headers(self) -> typing.Optional[typing.List[typing.Dict[str, str]]]:
+    def custom_headers(self) -> RawHeaders:
         """
-        headers property for response
+        headers property for response, list of encoded (name, value) pairs
 
         :return:
         """
         return self._custom_headers
 
     @custom_headers.setter
-    def custom_headers(self, value):
-        self._custom_headers = value
+    def custom_headers(self, value: Headers):
+        self._custom_headers = encode_headers(value, self.charset)
 
     @property
     def status_code(self) -> int:
@@ -75,21 +111,19 @@ class SimpleResponse:
     def status_code(self, value):
         self._status_code = value
 
-    def _create_headers(self) -> typing.List[typing.List[bytes]]:
-        _headers = [
-            [b"content-length", str(len(self.parse_body())).encode(self.charset)],
-            [
-                b"content-type",
-                f"{self.content_type}; charset={self.charset}".encode(self.charset),
-            ],
-        ]
-
-        if self.custom_headers is not None:
-            _header = []
-            for header in self.custom_headers:
-                for k, v in header.items():
-                    _header = [k.encode(self.charset), v.encode(self.charset)]
-                _headers.append(_header)
+    def _create_headers(self, body: typing.Optional[bytes]) -> RawHeaders:
+        """
+        create response headers, without content-length if body is None
+        (body is streamed with chunked transfer)
+        :param body:
+        :return:
+        """
+        _headers = [(b"content-type", self.content_type_header)]
+        if body is not None:
+            _headers.insert(
+                0, (b"content-length", str(len(body)).encode(self.charset))
+            )
+        _headers.extend(self._custom_headers)
         return _headers
 
     def set_headers(self, headers: typing.Dict[str, str]) -> None:
@@ -98,21 +132,34 @@ class SimpleResponse:
         :param headers:
         :return:
         """
-        if self.custom_headers is None:
-            self.custom_headers = []
-        self.custom_headers.append(headers)
+        self._custom_headers.extend(encode_headers(headers, self.charset))
+
+    async def render(self) -> bytes:
+        """
+        produce encoded body before response is sent
+        :return:
+        """
+        return self.parse_body()
 
     def parse_body(self) -> bytes:
         """
-        encode response body to bytes
+        encode response body to bytes,
+        it is encoded only once until body is replaced
         :return:
         """
-        if isinstance(self.body, bytes):
-            return self.body
-        if isinstance(self.body, dict):
-            return JSON.dumps(self.body).encode(self.charset)
+        body = self.body
+        if self._encoded_body is None or self._encoded_source is not body:
+            self._encoded_body = self._encode_body(body)
+            self._encoded_source = body
+        return self._encoded_body
+
+    def _encode_body(self, body: typing.Any) -> bytes:
+        if isinstance(body, bytes):
+            return body
+        if isinstance(body, dict):
+            return json_codec_var.get().dumps(body)
 
-        return self.body.encode(self.charset)
+        return body.encode(self.charset)
 
 
 class TextResponse(SimpleResponse):
@@ -124,8 +171,19 @@ class HTMLResponse(SimpleResponse):
 
 
 class JsonResponse(SimpleResponse):
+    """
+    response with body encoded by json codec of app (str and bytes are sent as is)
+    """
+
     content_type = "application/json"
 
+    def _encode_body(self, body: typing.Any) -> bytes:
+        if isinstance(body, bytes):
+            return body
+        if isinstance(body, str):
+            return body.encode(self.charset)
+        return json_codec_var.get().dumps(body)
+
 
 class TemplateResponse(SimpleResponse):
     """
@@ -138,20 +196,456 @@ class TemplateResponse(SimpleResponse):
         super().__init__(b"")
         self.template = template
         self.template_data = kwargs
+        self._rendered = False
 
     async def _render_template(self) -> str:
-        if env_var.get() == "/":
-            env_var.set("")
-        if AIOFile is None:
-            with open(f"{env_var.get()}{self.template}", "r", encoding="utf-8") as file:
-                template = jinja2.Template(file.read())
-        else:
-            async with AIOFile(
-                f"{env_var.get()}{self.template}", "r", encoding="utf-8"
-            ) as file:
-                template = jinja2.Template(await file.read())
-        return template.render(self.template_data)
+        return get_templates().render(self.template, self.template_data)
+
+    async def render(self) -> bytes:
+        if not self._rendered:
+            self.body = await self._render_template()
+            self._rendered = True
+        return self.parse_body()
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        self.body = await self._render_template()
+        await self.render()
         await super().__call__(scope, receive, send)
+
+
+class StreamingTemplateResponse(TemplateResponse):
+    """
+    response for rendering large templates by parts,
+    rendered parts are sent when flush_size bytes are collected
+    """
+
+    flush_size = 16384
+    cacheable = False
+
+    def __init__(
+        self, template: str, flush_size: typing.Optional[int] = None, **kwargs
+    ):
+        super().__init__(template, **kwargs)
+        if flush_size is not None:
+            self.flush_size = flush_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self._create_headers(None),
+            }
+        )
+        buffer: typing.List[bytes] = []
+        buffer_size = 0
+        async for part in get_templates().generate(
+            self.template, self.template_data
+        ):
+            chunk = part.encode(self.charset)
+            buffer.append(chunk)
+            buffer_size += len(chunk)
+            if buffer_size >= self.flush_size:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": b"".join(buffer),
+                        "more_body": True,
+                    }
+                )
+                buffer.clear()
+                buffer_size = 0
+        await send({"type": "http.response.body", "body": b"".join(buffer)})
+
+
+class StreamingResponse(SimpleResponse):
+    """
+    response for sending body by parts from sync or async iterable
+    of bytes or str.
+    parts of sync iterators (generators, files, db cursors) are read
+    in thread pool, so blocking reads do not stop event loop.
+
+    every part is sent after previous one is accepted by server (backpressure),
+    iteration stops and iterator is closed when client disconnects
+    """
+
+    cacheable = False
+
+    def __init__(
+        self,
+        body: typing.Union[typing.Iterable, typing.AsyncIterable],
+        headers: Headers = None,
+        status_code: int = 200,
+        content_type: typing.Optional[str] = None,
+    ):
+        super().__init__(body, headers=headers, status_code=status_code)
+        if content_type is not None:
+            self.content_type = content_type
+            self.content_type_header = f"{content_type}; charset={self.charset}".encode(
+                self.charset
+            )
+
+    async def _iterate(self) -> typing.AsyncIterator[typing.Union[bytes, str]]:
+        if hasattr(self.body, "__aiter__"):
+            async for chunk in self.body:
+                yield chunk
+        elif isinstance(self.body, (list, tuple)):
+            for chunk in self.body:
+                yield chunk
+        else:
+            iterator = iter(self.body)
+            loop = asyncio.get_running_loop()
+            while True:
+                chunk = await loop.run_in_executor(None, next, iterator, _END)
+                if chunk is _END:
+                    break
+                yield chunk
+
+    async def _stream_body(self, send: Send) -> None:
+        iterator = self._iterate()
+        try:
+            async for chunk in iterator:
+                if not chunk:
+                    continue
+                if not isinstance(chunk, bytes):
+                    chunk = chunk.encode(self.charset)
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        finally:
+            await iterator.aclose()
+            close = getattr(self.body, "aclose", None) or getattr(
+                self.body, "close", None
+            )
+            if close is not None:
+                try:
+                    result = close()
+                except ValueError:
+                    # generator is still running in thread after disconnect,
+                    # it is closed when it is collected
+                    result = None
+                if asyncio.iscoroutine(result):
+                    await result
+        await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    async def _wait_disconnect(receive: Receive) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self._create_headers(None),
+            }
+        )
+        stream_task = asyncio.ensure_future(self._stream_body(send))
+        disconnect_task = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await asyncio.wait(
+                (stream_task, disconnect_task), return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for task in (stream_task, disconnect_task):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(stream_task, disconnect_task, return_exceptions=True)
+        if not stream_task.cancelled() and stream_task.exception() is not None:
+            raise stream_task.exception()
+
+
+class FileCache:
+    """
+    lru cache of small files content,
+    entries are keyed on path, mtime and size so changed files are reread
+    """
+
+    def __init__(self, max_entries: int = 128, max_file_size: int = 262144):
+        self.max_entries = max_entries
+        self.max_file_size = max_file_size
+        self._data: "OrderedDict[typing.Tuple[str, int, int], bytes]" = OrderedDict()
+
+    def get(self, key: typing.Tuple[str, int, int]) -> typing.Optional[bytes]:
+        content = self._data.get(key)
+        if content is not None:
+            self._data.move_to_end(key)
+        return content
+
+    def set(self, key: typing.Tuple[str, int, int], content: bytes) -> None:
+        if len(content) > self.max_file_size or self.max_entries <= 0:
+            return None
+        self._data[key] = content
+        if len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return None
+
+
+def _parse_range(value: str, size: int) -> typing.Optional[typing.Tuple[int, int]]:
+    """
+    parse single "bytes=start-end" range header to (start, end) inclusive
+
+    :raises ValueError: range is not satisfiable
+    :return: None if header is not a valid single bytes range
+    """
+    unit, _, ranges = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start_value, separator, end_value = ranges.strip().partition("-")
+    start_value, end_value = start_value.strip(), end_value.strip()
+    if (
+        not separator
+        or not (start_value or end_value)
+        or (start_value and not start_value.isdigit())
+        or (end_value and not end_value.isdigit())
+    ):
+        return None
+
+    if not start_value:
+        suffix = int(end_value)
+        if suffix == 0:
+            raise ValueError("range not satisfiable")
+        return max(size - suffix, 0), size - 1
+
+    start = int(start_value)
+    end = int(end_value) if end_value else size - 1
+    if end_value and end < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class FileResponse(SimpleResponse):
+    """
+    response for sending file from disk
+
+    file is sent with http.response.pathsend or http.response.zerocopysend
+    if server supports these extensions, otherwise it is read by chunks.
+    supports range requests (206), etag and last-modified (304)
+    """
+
+    chunk_size = 65536
+    cacheable = False
+
+    def __init__(
+        self,
+        path: str,
+        headers: Headers = None,
+        status_code: int = 200,
+        content_type: typing.Optional[str] = None,
+        filename: typing.Optional[str] = None,
+        cache: typing.Optional[FileCache] = None,
+    ):
+        super().__init__(b"", headers=headers, status_code=status_code)
+        self.path = path
+        self.cache = cache
+        if content_type is None:
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.content_type = content_type
+        if content_type.startswith("text/"):
+            content_type = f"{content_type}; charset={self.charset}"
+        self.content_type_header = content_type.encode(self.charset)
+        if filename is not None:
+            self.set_headers(
+                {"content-disposition": f'attachment; filename="{filename}"'}
+            )
+
+    async def _send_start(
+        self, send: Send, status: int, headers: RawHeaders
+    ) -> None:
+        headers.extend(self._custom_headers)
+        await send(
+            {"type": "http.response.start", "status": status, "headers": headers}
+        )
+
+    @staticmethod
+    def _not_modified(
+        request_headers: typing.Dict[bytes, bytes], etag: str, mtime: float
+    ) -> bool:
+        if_none_match = request_headers.get(b"if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.decode("latin-1").split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = request_headers.get(b"if-modified-since")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since.decode("latin-1"))
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since.timestamp()
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            stat_result = os.stat(self.path)
+        except (FileNotFoundError, NotADirectoryError):
+            await TextResponse("Not Found", status_code=404)(scope, receive, send)
+            return None
+
+        size = stat_result.st_size
+        etag = f'"{stat_result.st_mtime_ns:x}-{size:x}"'
+        headers: RawHeaders = [
+            (b"etag", etag.encode("latin-1")),
+            (
+                b"last-modified",
+                formatdate(stat_result.st_mtime, usegmt=True).encode("latin-1"),
+            ),
+            (b"accept-ranges", b"bytes"),
+        ]
+        request_headers = dict(scope.get("headers") or [])
+        if self.status_code == 200 and self._not_modified(
+            request_headers, etag, stat_result.st_mtime
+        ):
+            await self._send_start(send, 304, headers)
+            await send({"type": "http.response.body", "body": b""})
+            return None
+
+        status = self.status_code
+        start, end = 0, size - 1
+        range_header = request_headers.get(b"range")
+        if_range = request_headers.get(b"if-range")
+        if (
+            status == 200
+            and range_header is not None
+            and (if_range is None or if_range.decode("latin-1") == etag)
+        ):
+            try:
+                byte_range = _parse_range(range_header.decode("latin-1"), size)
+            except ValueError:
+                headers.append((b"content-range", f"bytes */{size}".encode()))
+                headers.append((b"content-length", b"0"))
+                await self._send_start(send, 416, headers)
+                await send({"type": "http.response.body", "body": b""})
+                return None
+            if byte_range is not None:
+                start, end = byte_range
+                status = 206
+                headers.append(
+                    (b"content-range", f"bytes {start}-{end}/{size}".encode())
+                )
+
+        count = end - start + 1
+        headers.append((b"content-type", self.content_type_header))
+        headers.append((b"content-length", str(count).encode()))
+        await self._send_start(send, status, headers)
+
+        if scope.get("method") == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return None
+        await self._send_file(scope, send, stat_result, start, count)
+        return None
+
+    async def _send_file(
+        self,
+        scope: Scope,
+        send: Send,
+        stat_result: os.stat_result,
+        start: int,
+        count: int,
+    ) -> None:
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions and count == stat_result.st_size:
+            await send(
+                {"type": "http.response.pathsend", "path": os.path.abspath(self.path)}
+            )
+            return None
+
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as file:
+                await send(
+                    {
+                        "type": "http.response.zerocopysend",
+                        "file": file,
+                        "offset": start,
+                        "count": count,
+                    }
+                )
+            return None
+
+        cache_key = (self.path, stat_result.st_mtime_ns, stat_result.st_size)
+        if self.cache is not None:
+            content = self.cache.get(cache_key)
+            if content is None and stat_result.st_size <= self.cache.max_file_size:
+                content = await self._read(0, stat_result.st_size)
+                self.cache.set(cache_key, content)
+            if content is not None:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": content[start : start + count],
+                    }
+                )
+                return None
+
+        async for chunk in self._read_chunks(start, count):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+        return None
+
+    async def _read(self, offset: int, size: int) -> bytes:
+        return b"".join([chunk async for chunk in self._read_chunks(offset, size)])
+
+    async def _read_chunks(self, start: int, count: int) -> typing.AsyncIterator[bytes]:
+        offset = start
+        end = start + count
+        if AIOFile is not None:
+            async with AIOFile(self.path, "rb") as file:
+                while offset < end:
+                    chunk = await file.read(min(self.chunk_size, end - offset), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    yield chunk
+            return
+
+        loop = asyncio.get_running_loop()
+        with open(self.path, "rb") as sync_file:
+            sync_file.seek(offset)
+            while offset < end:
+                chunk = await loop.run_in_executor(
+                    None, sync_file.read, min(self.chunk_size, end - offset)
+                )
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+
+
+class JsonArrayResponse(StreamingResponse):
+    """
+    response for streaming large lists as json array,
+    items of sync or async iterable are encoded one by one
+    and sent by parts of flush_size bytes
+    """
+
+    content_type = "application/json"
+    flush_size = 65536
+
+    def __init__(
+        self,
+        body: typing.Union[typing.Iterable, typing.AsyncIterable],
+        headers: Headers = None,
+        status_code: int = 200,
+        flush_size: typing.Optional[int] = None,
+    ):
+        super().__init__(body, headers=headers, status_code=status_code)
+        if flush_size is not None:
+            self.flush_size = flush_size
+
+    async def _iterate(self) -> typing.AsyncIterator[typing.Union[bytes, str]]:
+        dumps = json_codec_var.get().dumps
+        buffer = bytearray(b"[")
+        first = True
+        async for item in super()._iterate():
+            if not first:
+                buffer += b","
+            first = False
+            buffer += dumps(item)
+            if len(buffer) >= self.flush_size:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += b"]"
+        yield bytes(buffer)
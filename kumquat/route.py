@@ -1,9 +1,12 @@
 """
 route schema
 """
+import re
 import typing
+from collections import OrderedDict, namedtuple
 from vbml import Patcher, PatchedValidators
 from vbml import Pattern
+from kumquat.admission import ConcurrencyLimit, RateLimiter
 from kumquat.exceptions import KumquatException
 from kumquat._types import Method
 
@@ -13,12 +16,27 @@ class Route:
     app route with path and func
     """
 
-    def __init__(self, path: str, func: typing.Callable, methods: typing.Tuple[Method]):
+    def __init__(
+        self,
+        path: str,
+        func: typing.Callable,
+        methods: typing.Tuple[Method],
+        response_class: typing.Optional[type] = None,
+    ):
         if not path.startswith("/"):
             raise KumquatException("Path must startswith from '/'")
         self.methods = methods
         self.path = path
         self.func = func
+        self.response_class = response_class
+        self.dispatcher: typing.Optional[typing.Callable] = None
+        self.cache_ttl: typing.Optional[float] = None
+        self.cache_vary: typing.Tuple[str, ...] = ()
+        self.single_flight: typing.Optional[typing.Callable[..., str]] = None
+        self.limit: typing.Optional[ConcurrencyLimit] = None
+        self.rate_limit: typing.Optional[RateLimiter] = None
+        self.timeout: typing.Optional[float] = None
+        self.cancel_on_disconnect = False
 
     def __repr__(self):
         return f'Route("{self.path}", {self.func})'
@@ -61,17 +79,115 @@ class RoutePatcher(Patcher):
         return RoutePattern(_pattern, **context)
 
 
+class RouteNode:
+    """
+    node of the segment tree used by router
+    """
+
+    __slots__ = ("static", "param", "routes")
+
+    def __init__(self):
+        self.static: typing.Dict[str, "RouteNode"] = {}
+        self.param: typing.Optional["RouteNode"] = None
+        self.routes: typing.Dict[
+            str, typing.Tuple[Route, typing.Tuple[str, ...]]
+        ] = {}
+
+    def __repr__(self):
+        return f"RouteNode({list(self.static)}, {self.param is not None})"
+
+
+_PARAM_SEGMENT = re.compile(r"^<([A-Za-z_][A-Za-z0-9_]*)>$")
+
+
+def split_path(path: str) -> typing.List[str]:
+    """
+    split path to segments ('/' -> [], '/a/b' -> ['a', 'b'])
+    :param path:
+    :return:
+    """
+    path = path.strip("/")
+    if not path:
+        return []
+    return path.split("/")
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+_RouteMatch = typing.Tuple[typing.Dict[str, str], typing.Optional[Route]]
+
+
+class RouteCache:
+    """
+    lru cache of recent (path, method) -> (path_dict, route) matches
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[typing.Tuple[str, str], _RouteMatch]" = OrderedDict()
+
+    def get(self, key: typing.Tuple[str, str]) -> typing.Optional[_RouteMatch]:
+        """
+        get cached match and mark it as recently used
+        :param key:
+        :return:
+        """
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: typing.Tuple[str, str], value: _RouteMatch) -> None:
+        """
+        save match, the least recently used one is dropped if cache is full
+        :param key:
+        :param value:
+        :return:
+        """
+        if self.maxsize <= 0:
+            return None
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return None
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+
 class Router:
     """
     class for saving all app routes
+
+    routes with plain segments (/users/<name>) are stored in segment tree,
+    lookup is linear from path length, not from routes count.
+    routes with complex vbml patterns (/user<id>.json, <id:int>)
+    are checked by vbml after the tree.
+
+    static paths are also indexed in dict and recent dynamic matches
+    are kept in lru cache (cache_size=0 disables it)
     """
 
-    def __init__(self):
+    def __init__(self, cache_size: int = 1024):
         self.patcher = RoutePatcher(validators=Validators, default_validators=["route"])
         self.pattern = self.patcher.pattern
         self.routes: typing.Dict[
             typing.Tuple[typing.Tuple[Method], Pattern], Route
         ] = {}
+        self.tree = RouteNode()
+        self.pattern_routes: typing.List[typing.Tuple[Pattern, Route]] = []
+        self.static_routes: typing.Dict[str, typing.Dict[str, Route]] = {}
+        self.cache = RouteCache(cache_size)
 
     def add_route(self, route: Route) -> None:
         """
@@ -79,24 +195,142 @@ class Router:
         :param route:
         :return:
         """
-        self.routes[(route.methods, self.pattern(route.path))] = route
+        pattern = self.pattern(route.path)
+        self.routes[(route.methods, pattern)] = route
+        self.cache.clear()
+
+        node = self.tree
+        params: typing.List[str] = []
+        for segment in split_path(route.path):
+            param = _PARAM_SEGMENT.match(segment)
+            if param is not None:
+                if node.param is None:
+                    node.param = RouteNode()
+                node = node.param
+                params.append(param.group(1))
+            elif "<" in segment:
+                self.pattern_routes.append((pattern, route))
+                return None
+            else:
+                node = node.static.setdefault(segment, RouteNode())
+
+        for method in route.methods:
+            node.routes.setdefault(method, (route, tuple(params)))
+        if not params:
+            static_path = "/" + "/".join(split_path(route.path))
+            methods = self.static_routes.setdefault(static_path, {})
+            for method in route.methods:
+                methods.setdefault(method, route)
+        return None
+
+    def _find_node(
+        self,
+        node: RouteNode,
+        segments: typing.List[str],
+        index: int,
+        values: typing.List[str],
+        method: typing.Optional[str],
+    ) -> typing.Optional[RouteNode]:
+        if index == len(segments):
+            if method is None:
+                return node if node.routes else None
+            return node if method in node.routes else None
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._find_node(child, segments, index + 1, values, method)
+            if found is not None:
+                return found
+
+        if node.param is not None and segment:
+            values.append(segment)
+            found = self._find_node(node.param, segments, index + 1, values, method)
+            if found is not None:
+                return found
+            values.pop()
+        return None
 
-    def get_route(
-        self, path: str, method: str
-    ) -> typing.Tuple[typing.Dict[str, str], typing.Optional[Route]]:
+    def get_route(self, path: str, method: str) -> _RouteMatch:
         """
         get route object from string path
+
+        if path is found but method is not allowed,
+        route with other methods is returned (405)
         :param method:
         :param path:
         :return:
         """
-        for route_methods, route_pattern in self.routes:
-            if path == route_pattern.text:
-                return {}, self.routes.get((route_methods, route_pattern))
+        methods = self.static_routes.get(path)
+        if methods is not None:
+            route = methods.get(method)
+            if route is not None:
+                return {}, route
 
-            if self.patcher.check(path, route_pattern):
-                return (
-                    self.patcher.check(path, route_pattern),
-                    self.routes.get((route_methods, route_pattern)),
-                )
+        key = (path, method)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return dict(cached[0]), cached[1]
+
+        path_dict, route = self._match(path, method)
+        if route is not None and method in route.methods:
+            self.cache.set(key, (dict(path_dict), route))
+        return path_dict, route
+
+    def _match(self, path: str, method: str) -> _RouteMatch:
+        segments = split_path(path)
+        values: typing.List[str] = []
+        node = self._find_node(self.tree, segments, 0, values, method)
+        if node is not None:
+            route, params = node.routes[method]
+            return dict(zip(params, values)), route
+
+        not_allowed: typing.Optional[_RouteMatch] = None
+        for route_pattern, route in self.pattern_routes:
+            path_dict = self.patcher.check(path, route_pattern)
+            if not path_dict:
+                continue
+            if method in route.methods:
+                return path_dict, route
+            if not_allowed is None:
+                not_allowed = path_dict, route
+
+        node = self._find_node(self.tree, segments, 0, values, None)
+        if node is not None:
+            route, params = next(iter(node.routes.values()))
+            return dict(zip(params, values)), route
+        if not_allowed is not None:
+            return not_allowed
         return {}, None
+
+    def allowed_methods(self, path: str) -> typing.List[str]:
+        """
+        get all methods allowed for path
+        :param path:
+        :return:
+        """
+        methods: typing.List[str] = []
+        self._collect_methods(self.tree, split_path(path), 0, methods)
+        for route_pattern, route in self.pattern_routes:
+            if self.patcher.check(path, route_pattern):
+                methods.extend(m for m in route.methods if m not in methods)
+        return methods
+
+    def _collect_methods(
+        self,
+        node: RouteNode,
+        segments: typing.List[str],
+        index: int,
+        methods: typing.List[str],
+    ) -> None:
+        if index == len(segments):
+            methods.extend(m for m in node.routes if m not in methods)
+            return None
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            self._collect_methods(child, segments, index + 1, methods)
+        if node.param is not None and segment:
+            self._collect_methods(node.param, segments, index + 1, methods)
+        return None
@@ -0,0 +1,129 @@
+"""
+pluggable json codecs, all of them encode to bytes
+"""
+import dataclasses
+import datetime
+import decimal
+import enum
+import json
+import typing
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+DefaultSerializer = typing.Callable[[typing.Any], typing.Any]
+
+
+def default_serializer(obj: typing.Any) -> typing.Any:
+    """
+    convert objects unknown to json (dataclasses, datetimes, uuid,
+    decimal, enums, sets, numpy arrays and scalars) to json types
+    :param obj:
+    :return:
+    """
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (uuid.UUID, decimal.Decimal)):
+        return str(obj)
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "tolist"):  # numpy arrays and scalars
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONCodec:
+    """
+    stdlib json codec, base class for codecs
+
+    :param default: function for serializing unknown objects,
+    called before default_serializer
+    """
+
+    name = "json"
+
+    def __init__(self, default: typing.Optional[DefaultSerializer] = None):
+        self.user_default = default
+
+    def default(self, obj: typing.Any) -> typing.Any:
+        if self.user_default is not None:
+            try:
+                return self.user_default(obj)
+            except TypeError:
+                pass
+        return default_serializer(obj)
+
+    def dumps(self, obj: typing.Any) -> bytes:
+        return json.dumps(obj, default=self.default).encode("utf-8")
+
+    def loads(self, data: typing.Union[bytes, str]) -> typing.Any:
+        return json.loads(data)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}()"
+
+
+class UJSONCodec(JSONCodec):
+    name = "ujson"
+
+    def dumps(self, obj: typing.Any) -> bytes:
+        return ujson.dumps(obj, default=self.default).encode("utf-8")
+
+    def loads(self, data: typing.Union[bytes, str]) -> typing.Any:
+        return ujson.loads(data)
+
+
+class ORJSONCodec(JSONCodec):
+    name = "orjson"
+
+    def __init__(
+        self, default: typing.Optional[DefaultSerializer] = None, option: int = 0
+    ):
+        super().__init__(default)
+        self.option = option | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj: typing.Any) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=self.option)
+
+    def loads(self, data: typing.Union[bytes, str]) -> typing.Any:
+        return orjson.loads(data)
+
+
+CODECS: typing.Dict[str, typing.Type[JSONCodec]] = {"json": JSONCodec}
+if ujson is not None:
+    CODECS["ujson"] = UJSONCodec
+if orjson is not None:
+    CODECS["orjson"] = ORJSONCodec
+
+
+def get_codec(
+    codec: typing.Union[str, JSONCodec, None] = None,
+    default: typing.Optional[DefaultSerializer] = None,
+) -> JSONCodec:
+    """
+    get codec by name, the fastest installed one (orjson, ujson, json) if None
+    :param codec:
+    :param default:
+    :return:
+    """
+    if isinstance(codec, JSONCodec):
+        return codec
+    if codec is None:
+        for name in ("orjson", "ujson", "json"):
+            if name in CODECS:
+                return CODECS[name](default)
+    if codec not in CODECS:
+        raise ImportError(f"json codec <<{codec}>> is not installed")
+    return CODECS[codec](default)
@@ -0,0 +1,231 @@
+"""
+pre-fork multi worker server based on uvicorn
+"""
+import os
+import time
+import random
+import signal
+import socket
+import typing
+import logging
+
+import uvicorn
+
+from kumquat.exceptions import KumquatException
+
+logger = logging.getLogger(__name__)
+
+HANDLED_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+class Server:
+    """
+    master process binds socket once and forks workers sharing it,
+    dead workers (crashed or recycled after max_requests) are started again.
+
+    SIGINT/SIGTERM stop workers gracefully, SIGHUP restarts them one by one
+
+    :param app: asgi app, it is inherited by forked workers, so import string
+    is not needed
+    :param workers: count of worker processes, 1 runs uvicorn in this process
+    :param loop: "auto" uses uvloop if it is installed, or "asyncio"
+    :param http: "auto" uses httptools if it is installed, or "h11"
+    :param backlog: max count of connections waiting for accept
+    :param keep_alive: seconds to keep idle connection open
+    :param limit_concurrency: max count of connections and tasks of worker,
+    503 is sent when it is exceeded
+    :param max_requests: worker is restarted after this count of requests
+    :param max_requests_jitter: random 0..jitter added to max_requests of each
+    worker, so they are not restarted at once
+    :param graceful_timeout: seconds to wait for workers before killing them
+    """
+
+    def __init__(
+        self,
+        app: typing.Callable,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        workers: int = 1,
+        loop: str = "auto",
+        http: str = "auto",
+        backlog: int = 2048,
+        keep_alive: int = 5,
+        limit_concurrency: typing.Optional[int] = None,
+        max_requests: typing.Optional[int] = None,
+        max_requests_jitter: int = 0,
+        graceful_timeout: float = 30.0,
+        log_level: str = "info",
+    ):
+        if workers < 1:
+            raise KumquatException("workers count must be positive")
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.config_options: typing.Dict[str, typing.Any] = {
+            "host": host,
+            "port": port,
+            "loop": loop,
+            "http": http,
+            "backlog": backlog,
+            "timeout_keep_alive": keep_alive,
+            "limit_concurrency": limit_concurrency,
+            "log_level": log_level,
+            "timeout_graceful_shutdown": graceful_timeout,
+        }
+        self.children: typing.Dict[int, int] = {}  # pid -> worker number
+        self._should_exit = False
+        self._should_reload = False
+
+    def config(self) -> uvicorn.Config:
+        limit_max_requests = self.max_requests
+        if limit_max_requests is not None and self.max_requests_jitter:
+            limit_max_requests += random.randint(0, self.max_requests_jitter)
+        return uvicorn.Config(
+            self.app, limit_max_requests=limit_max_requests, **self.config_options
+        )
+
+    def run(self) -> None:
+        if self.workers == 1:
+            uvicorn.Server(self.config()).run()
+            return None
+        if not hasattr(os, "fork"):
+            raise KumquatException("several workers need os.fork (unix only)")
+
+        sock = self.config().bind_socket()
+        for signum in HANDLED_SIGNALS:
+            signal.signal(signum, self._handle_exit)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        logger.info(
+            "Started master process [%d] with %d workers", os.getpid(), self.workers
+        )
+
+        try:
+            for number in range(self.workers):
+                self._spawn(sock, number)
+            self._supervise(sock)
+        finally:
+            self._stop_workers()
+            sock.close()
+        logger.info("Stopped master process [%d]", os.getpid())
+        return None
+
+    def _spawn(self, sock: socket.socket, number: int) -> None:
+        config = self.config()
+        pid = os.fork()
+        if pid:
+            self.children[pid] = number
+            return None
+
+        # worker process
+        for signum in HANDLED_SIGNALS + (signal.SIGHUP,):
+            signal.signal(signum, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            uvicorn.Server(config).run(sockets=[sock])
+        except BaseException:
+            logger.exception("worker %d failed", number)
+            exit_code = 1
+        finally:
+            os._exit(exit_code)
+
+    def _supervise(self, sock: socket.socket) -> None:
+        while not self._should_exit:
+            if self._should_reload:
+                self._should_reload = False
+                self._reload(sock)
+            self._reap(sock)
+            time.sleep(0.1)
+
+    def _reap(self, sock: typing.Optional[socket.socket]) -> None:
+        """
+        collect exited workers, start new ones if socket is passed
+        :param sock:
+        :return:
+        """
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return None
+            if not pid:
+                return None
+            number = self.children.pop(pid, None)
+            if number is None:
+                continue
+            if sock is not None and not self._should_exit:
+                logger.info(
+                    "worker [%d] exited with status %d, starting new one",
+                    pid,
+                    status,
+                )
+                self._spawn(sock, number)
+        return None
+
+    def _reload(self, sock: socket.socket) -> None:
+        """
+        restart workers one by one, others keep serving meanwhile
+        :param sock:
+        :return:
+        """
+        logger.info("Restarting workers")
+        for pid in list(self.children):
+            if self._should_exit:
+                return None
+            number = self.children.pop(pid)
+            self._spawn(sock, number)
+            self._terminate(pid)
+        return None
+
+    def _terminate(self, pid: int) -> None:
+        """
+        stop worker gracefully, kill it after graceful timeout
+        :param pid:
+        :return:
+        """
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return None
+        deadline = time.monotonic() + self.graceful_timeout
+        while time.monotonic() < deadline:
+            try:
+                finished, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                return None
+            if finished:
+                return None
+            time.sleep(0.05)
+        logger.warning("worker [%d] is killed after graceful timeout", pid)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        return None
+
+    def _stop_workers(self) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap(None)
+            time.sleep(0.05)
+        for pid in list(self.children):
+            logger.warning("worker [%d] is killed after graceful timeout", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.children.clear()
+
+    def _handle_exit(self, signum: int, frame: typing.Any) -> None:
+        self._should_exit = True
+
+    def _handle_reload(self, signum: int, frame: typing.Any) -> None:
+        self._should_reload = True
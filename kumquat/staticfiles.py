@@ -0,0 +1,80 @@
+"""
+static files serving
+"""
+import mimetypes
+import os
+import typing
+
+from kumquat.compression import negotiate
+from kumquat.request import Request
+from kumquat.response import FileResponse, FileCache, SimpleResponse, TextResponse
+
+
+class StaticFiles:
+    """
+    route func serving files from directory under path prefix
+
+    with precompressed=True file.br, file.zst or file.gz near the file
+    is sent if client accepts its encoding
+    """
+
+    precompressed_extensions = {"br": ".br", "zstd": ".zst", "gzip": ".gz"}
+
+    def __init__(
+        self,
+        prefix: str,
+        directory: str,
+        cache_size: int = 0,
+        cache_max_file_size: int = 262144,
+        precompressed: bool = True,
+    ):
+        self.precompressed = precompressed
+        self.prefix = prefix.rstrip("/")
+        self.directory = os.path.realpath(directory)
+        self.cache: typing.Optional[FileCache] = None
+        if cache_size > 0:
+            self.cache = FileCache(cache_size, cache_max_file_size)
+
+    def match(self, path: str) -> bool:
+        """
+        check if path is under prefix of this static mount
+        :param path:
+        :return:
+        """
+        return path.startswith(self.prefix + "/")
+
+    def get_file_path(self, path: str) -> typing.Optional[str]:
+        """
+        get path of file in directory, None if it is outside of directory
+        :param path:
+        :return:
+        """
+        relative_path = path[len(self.prefix) :].lstrip("/")
+        file_path = os.path.realpath(os.path.join(self.directory, relative_path))
+        if not file_path.startswith(self.directory + os.sep):
+            return None
+        return file_path
+
+    async def __call__(
+        self, request: Request, response: SimpleResponse
+    ) -> typing.Union[FileResponse, typing.Tuple[TextResponse, int]]:
+        file_path = self.get_file_path(request.path)
+        if file_path is None or not os.path.isfile(file_path):
+            return TextResponse("Not Found"), 404
+
+        accept_encoding = request.headers.get(b"accept-encoding")
+        if self.precompressed and accept_encoding:
+            available = [
+                encoding
+                for encoding, extension in self.precompressed_extensions.items()
+                if os.path.isfile(file_path + extension)
+            ]
+            encoding = negotiate(accept_encoding, available) if available else None
+            if encoding is not None:
+                return FileResponse(
+                    file_path + self.precompressed_extensions[encoding],
+                    headers={"content-encoding": encoding, "vary": "accept-encoding"},
+                    content_type=mimetypes.guess_type(file_path)[0],
+                    cache=self.cache,
+                )
+        return FileResponse(file_path, cache=self.cache)
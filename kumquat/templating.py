@@ -0,0 +1,104 @@
+"""
+jinja2 templates environment
+"""
+import os
+import typing
+
+import jinja2
+
+
+class Templates:
+    """
+    shared jinja2 environment for app templates
+
+    compiled templates are kept in lru cache of environment (cache_size),
+    with bytecode_cache bytecode is also cached on disk
+    (True - jinja2 directory in temp dir, or path of directory),
+    so templates are not parsed again in new processes.
+    with auto_reload templates are recompiled when file mtime changes (dev mode)
+    """
+
+    def __init__(
+        self,
+        path: str = "templates/",
+        auto_reload: bool = False,
+        cache_size: int = 400,
+        bytecode_cache: typing.Union[bool, str] = False,
+    ):
+        self.path = path if path not in ("", "/") else "."
+        if bytecode_cache is True:
+            _bytecode_cache: typing.Optional[
+                jinja2.BytecodeCache
+            ] = jinja2.FileSystemBytecodeCache()
+        elif bytecode_cache:
+            _bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache)
+        else:
+            _bytecode_cache = None
+
+        self._environment_options: typing.Dict[str, typing.Any] = dict(
+            loader=jinja2.FileSystemLoader(self.path),
+            auto_reload=auto_reload,
+            cache_size=cache_size,
+        )
+        self.environment = jinja2.Environment(
+            bytecode_cache=_bytecode_cache, **self._environment_options
+        )
+        self._async_environment: typing.Optional[jinja2.Environment] = None
+
+    @property
+    def async_environment(self) -> jinja2.Environment:
+        """
+        environment with enable_async for streaming rendering,
+        created on first use
+        :return:
+        """
+        if self._async_environment is None:
+            # bytecode key does not depend on environment, async code
+            # is kept in separate files to not be loaded by sync environment
+            _bytecode_cache = self.environment.bytecode_cache
+            if isinstance(_bytecode_cache, jinja2.FileSystemBytecodeCache):
+                _bytecode_cache = jinja2.FileSystemBytecodeCache(
+                    _bytecode_cache.directory, "__jinja2_async_%s.cache"
+                )
+            else:
+                _bytecode_cache = None
+            self._async_environment = jinja2.Environment(
+                enable_async=True,
+                bytecode_cache=_bytecode_cache,
+                **self._environment_options,
+            )
+        return self._async_environment
+
+    def get_template(self, name: str) -> jinja2.Template:
+        """
+        get compiled template from cache or load it
+        :param name:
+        :return:
+        """
+        return self.environment.get_template(name)
+
+    def precompile(self) -> int:
+        """
+        load and compile all templates from templates directory
+        :return: count of compiled templates
+        """
+        if not os.path.isdir(self.path):
+            return 0
+        names = self.environment.list_templates()
+        for name in names:
+            self.environment.get_template(name)
+        return len(names)
+
+    def render(self, name: str, context: typing.Dict[str, typing.Any]) -> str:
+        return self.get_template(name).render(context)
+
+    def generate(
+        self, name: str, context: typing.Dict[str, typing.Any]
+    ) -> typing.AsyncIterator[str]:
+        """
+        render template by parts with async environment
+        :param name:
+        :param context:
+        :return:
+        """
+        return self.async_environment.get_template(name).generate_async(context)
@@ -2,28 +2,190 @@ import asyncio
 import concurrent.futures
 import functools
 import multiprocessing
+import time
 import typing
 
-from kumquat.exceptions import KumquatException
+from kumquat.context import executors_var
+from kumquat.exceptions import KumquatException, ExecutorRejected
 
 
-class BackgroundTask:
-    thread_pool: concurrent.futures.ThreadPoolExecutor = concurrent.futures.ThreadPoolExecutor(
-        max_workers=multiprocessing.cpu_count() * 5
+def _timed_call(func: typing.Callable) -> typing.Tuple[typing.Any, float, float]:
+    started = time.time()
+    result = func()
+    return result, started, time.time()
+
+
+class ExecutorMetrics:
+    """
+    counters and timings of executor tasks (seconds)
+    """
+
+    __slots__ = (
+        "submitted",
+        "completed",
+        "failed",
+        "rejected",
+        "queue_wait_total",
+        "queue_wait_max",
+        "run_time_total",
+        "run_time_max",
     )
 
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.run_time_total = 0.0
+        self.run_time_max = 0.0
+
+    def record(self, queue_wait: float, run_time: float) -> None:
+        self.completed += 1
+        self.queue_wait_total += queue_wait
+        self.run_time_total += run_time
+        if queue_wait > self.queue_wait_max:
+            self.queue_wait_max = queue_wait
+        if run_time > self.run_time_max:
+            self.run_time_max = run_time
+
+    def as_dict(self) -> typing.Dict[str, float]:
+        completed = self.completed or 1
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_wait_avg": self.queue_wait_total / completed,
+            "queue_wait_max": self.queue_wait_max,
+            "run_time_avg": self.run_time_total / completed,
+            "run_time_max": self.run_time_max,
+        }
+
+
+class Executor:
+    """
+    lazily created thread or process pool with bounded queue
+
+    :param kind: "thread" for blocking io, "process" for cpu-bound tasks
+    (function and arguments have to be picklable)
+    :param max_workers:
+    :param max_queue: max count of tasks waiting for free worker,
+    ExecutorRejected (503) is raised when it is exceeded, None is unbounded
+    """
+
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: typing.Optional[int] = None,
+        max_queue: typing.Optional[int] = None,
+    ):
+        if kind not in ("thread", "process"):
+            raise KumquatException("executor kind must be <<thread>> or <<process>>")
+        if max_workers is None:
+            cpu_count = multiprocessing.cpu_count()
+            max_workers = cpu_count * 5 if kind == "thread" else cpu_count
+        self.kind = kind
+        self.name = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.metrics = ExecutorMetrics()
+        self.pending = 0
+        self._pool: typing.Optional[concurrent.futures.Executor] = None
+
+    @property
+    def pool(self) -> concurrent.futures.Executor:
+        if self._pool is None:
+            if self.kind == "thread":
+                self._pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"kumquat-{self.name}",
+                )
+            else:
+                self._pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers
+                )
+        return self._pool
+
+    @property
+    def queued(self) -> int:
+        return max(self.pending - self.max_workers, 0)
+
+    async def run(self, func: typing.Callable, *args, **kwargs) -> typing.Any:
+        """
+        run function in pool
+        :raises ExecutorRejected: queue is full
+        :return:
+        """
+        if (
+            self.max_queue is not None
+            and self.pending >= self.max_workers + self.max_queue
+        ):
+            self.metrics.rejected += 1
+            raise ExecutorRejected(self.name)
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        self.metrics.submitted += 1
+        self.pending += 1
+        submitted = time.time()
+        try:
+            result, started, finished = await loop.run_in_executor(
+                self.pool, _timed_call, call
+            )
+        except BaseException:
+            self.metrics.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.metrics.record(started - submitted, finished - started)
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def __repr__(self):
+        return f'Executor("{self.kind}", max_workers={self.max_workers})'
+
+
+class BackgroundTask:
     def __init__(
         self, func: typing.Callable, *args, **kwargs,
     ):
         """
         Run task in background.
-        It will be started in ThreadPoolExecutor.
+        It will be started in "thread" executor of app (ThreadPoolExecutor),
+        use BackgroundTask.with_executor("process", func, ...)
+        for cpu-bound tasks.
+        Outside of app "thread" is default thread pool of event loop.
 
-        Pretty works with blocking tasks, bad works with cpu-bound tasks.
+        Pretty works with blocking tasks.
         """
         self._func = func
         self._args = args
         self._kwargs = kwargs
+        self.executor: typing.Union[str, Executor] = "thread"
+
+    @classmethod
+    def with_executor(
+        cls,
+        executor: typing.Union[str, Executor],
+        func: typing.Callable,
+        *args,
+        **kwargs,
+    ) -> "BackgroundTask":
+        """
+        create task for executor
+        :param executor: name of executor or executor itself (app.executors["db"])
+        :param func:
+        :return:
+        """
+        task = cls(func, *args, **kwargs)
+        task.executor = executor
+        return task
 
     async def __call__(self):
         return await self.__run()
@@ -35,8 +197,6 @@ class BackgroundTask:
         pass
 
     async def __run(self) -> typing.Union[typing.Any, typing.NoReturn]:
-        loop = asyncio.get_running_loop()
-
         if asyncio.iscoroutinefunction(self._func):
             raise KumquatException(
                 "function have to be synchronous,"
@@ -44,6 +204,79 @@ class BackgroundTask:
                 " use <<loop.create_task(coro)>>"
             )
 
-        func = functools.partial(self._func, *self._args, **self._kwargs,)
-        result = await loop.run_in_executor(self.thread_pool, func=func)
-        return result
+        executor = self.executor
+        if not isinstance(executor, Executor):
+            executors = executors_var.get()
+            if executors is None and executor == "thread":
+                loop = asyncio.get_running_loop()
+                call = functools.partial(self._func, *self._args, **self._kwargs)
+                return await loop.run_in_executor(None, call)
+            executor = (executors or {}).get(executor)
+        if executor is None:
+            raise KumquatException(f"executor <<{self.executor}>> does not exist")
+        return await executor.run(self._func, *self._args, **self._kwargs)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key:
+    the first caller runs the function, others wait for its result
+    (or exception) instead of running it again.
+    If the first caller is cancelled, waiters run the function again.
+    """
+
+    def __init__(self):
+        self._calls: typing.Dict[typing.Hashable, asyncio.Future] = {}
+
+    async def do(
+        self, key: typing.Hashable, func: typing.Callable[[], typing.Awaitable]
+    ) -> typing.Tuple[typing.Any, bool]:
+        """
+        :return: result and flag, True if result was produced by this caller
+        """
+        future = self._calls.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future), False
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # caller running function was cancelled, its call is not shared
+            future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # exception is raised to leader, waiters retrieve it from future
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            del self._calls[key]
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class State:
+    """
+    attribute container for shared app resources (db pools, http clients),
+    usually filled in startup hooks: app.state.db = await create_pool()
+    """
+
+    def __init__(self, **values: typing.Any):
+        self.__dict__.update(values)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        raise AttributeError(f"state has no attribute <<{name}>>")
+
+    def __repr__(self):
+        return f"State({self.__dict__})"
@@ -0,0 +1,296 @@
+"""
+websocket connection and broadcast
+"""
+import asyncio
+import typing
+
+from kumquat._types import Scope, Receive, Send, Message
+from kumquat.context import json_codec_var
+from kumquat.exceptions import KumquatException
+from kumquat.request import Headers
+
+CONNECTING = 0
+CONNECTED = 1
+DISCONNECTED = 2
+
+
+class WebSocketDisconnect(KumquatException):
+    """
+    client closed connection
+    """
+
+    def __init__(self, code: int = 1000):
+        super().__init__(code)
+        self.code = code
+
+
+def text_message(data: str) -> Message:
+    return {"type": "websocket.send", "text": data}
+
+
+def bytes_message(data: bytes) -> Message:
+    return {"type": "websocket.send", "bytes": data}
+
+
+class WebSocket:
+    """
+    websocket connection of route func
+
+    @app.websocket("/chat/<room>")
+    async def chat(websocket):
+        await websocket.accept()
+        async for text in websocket.iter_text():
+            await websocket.send_text(text)
+
+    messages queued with enqueue() (broadcast) are sent by background
+    sender task in batches, queue is bounded by max_queue,
+    connection is closed when it is full (slow consumer)
+    """
+
+    charset = "utf-8"
+
+    def __init__(
+        self, scope: Scope, receive: Receive, send: Send, max_queue: int = 64
+    ):
+        self._scope = scope
+        self._receive = receive
+        self._send = send
+        self.path_dict: typing.Dict[str, str] = {}
+        self.client_state = CONNECTING
+        self.close_code: typing.Optional[int] = None
+        self.max_queue = max_queue
+        self._queue: typing.Optional[asyncio.Queue] = None
+        self._sender: typing.Optional[asyncio.Future] = None
+
+    @property
+    def scope(self) -> Scope:
+        return self._scope
+
+    @property
+    def path(self) -> str:
+        return self._scope["path"]
+
+    @property
+    def app(self) -> typing.Any:
+        return self._scope.get("app")
+
+    @property
+    def headers(self) -> Headers:
+        return Headers(self._scope.get("headers") or [])
+
+    @property
+    def subprotocols(self) -> typing.List[str]:
+        return self._scope.get("subprotocols", [])
+
+    @property
+    def connected(self) -> bool:
+        return self.client_state == CONNECTED
+
+    async def accept(
+        self,
+        subprotocol: typing.Optional[str] = None,
+        headers: typing.Optional[typing.Dict[str, str]] = None,
+    ) -> None:
+        """
+        accept connection (handshake)
+        :param subprotocol:
+        :param headers:
+        :return:
+        """
+        if self.client_state == CONNECTING:
+            # websocket.connect message
+            await self._receive()
+        message: Message = {"type": "websocket.accept", "subprotocol": subprotocol}
+        if headers:
+            message["headers"] = [
+                (k.encode(self.charset), v.encode(self.charset))
+                for k, v in headers.items()
+            ]
+        await self._send(message)
+        self.client_state = CONNECTED
+
+    async def receive(self) -> Message:
+        """
+        receive raw asgi message
+        :raises WebSocketDisconnect: client closed connection
+        :return:
+        """
+        message = await self._receive()
+        if message["type"] == "websocket.disconnect":
+            self.client_state = DISCONNECTED
+            self.close_code = message.get("code", 1000)
+            self._stop_sender()
+            raise WebSocketDisconnect(self.close_code)
+        return message
+
+    async def receive_text(self) -> str:
+        message = await self.receive()
+        text = message.get("text")
+        if text is None:
+            return message["bytes"].decode(self.charset)
+        return text
+
+    async def receive_bytes(self) -> bytes:
+        message = await self.receive()
+        data = message.get("bytes")
+        if data is None:
+            return message["text"].encode(self.charset)
+        return data
+
+    async def receive_json(self) -> typing.Any:
+        message = await self.receive()
+        data = message.get("text")
+        if data is None:
+            data = message["bytes"]
+        return json_codec_var.get().loads(data)
+
+    async def iter_text(self) -> typing.AsyncIterator[str]:
+        """
+        iterate over received text messages until client disconnects
+        :return:
+        """
+        try:
+            while True:
+                yield await self.receive_text()
+        except WebSocketDisconnect:
+            return
+
+    async def iter_bytes(self) -> typing.AsyncIterator[bytes]:
+        try:
+            while True:
+                yield await self.receive_bytes()
+        except WebSocketDisconnect:
+            return
+
+    async def send(self, message: Message) -> None:
+        """
+        send raw asgi message
+        :param message:
+        :return:
+        """
+        if self.client_state == DISCONNECTED:
+            raise WebSocketDisconnect(self.close_code or 1006)
+        try:
+            await self._send(message)
+        except OSError:
+            self.client_state = DISCONNECTED
+            raise WebSocketDisconnect(1006)
+
+    async def send_text(self, data: str) -> None:
+        await self.send(text_message(data))
+
+    async def send_bytes(self, data: bytes) -> None:
+        await self.send(bytes_message(data))
+
+    async def send_json(self, data: typing.Any) -> None:
+        await self.send_bytes(json_codec_var.get().dumps(data))
+
+    def enqueue(self, message: Message) -> bool:
+        """
+        put message to bounded send queue without waiting,
+        connection is closed if queue is full
+        :param message: asgi message, encoded once for all receivers
+        :return: False if connection is dropped
+        """
+        if self.client_state != CONNECTED:
+            return False
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._sender = asyncio.ensure_future(self._send_queued())
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._drop()
+            return False
+        return True
+
+    async def _send_queued(self) -> None:
+        queue = self._queue
+        try:
+            while True:
+                batch = [await queue.get()]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                for message in batch:
+                    await self._send(message)
+        except OSError:
+            self.client_state = DISCONNECTED
+
+    def _drop(self) -> None:
+        """
+        close slow consumer, its queued messages are discarded
+        :return:
+        """
+        self._stop_sender()
+        self.client_state = DISCONNECTED
+        self.close_code = 1013  # try again later
+        asyncio.ensure_future(self._close_quietly())
+
+    async def _close_quietly(self) -> None:
+        try:
+            await self._send({"type": "websocket.close", "code": self.close_code})
+        except OSError:
+            pass
+
+    def _stop_sender(self) -> None:
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
+
+    async def close(self, code: int = 1000) -> None:
+        if self.client_state == DISCONNECTED:
+            return None
+        self._stop_sender()
+        self.client_state = DISCONNECTED
+        self.close_code = code
+        await self._send({"type": "websocket.close", "code": code})
+        return None
+
+    def __repr__(self):
+        return f'WebSocket("{self.path}")'
+
+
+class Broadcast:
+    """
+    group of connections receiving the same messages,
+    message is encoded once and put to bounded queue of every connection,
+    slow consumers with full queue are dropped instead of growing memory
+    """
+
+    def __init__(self):
+        self.connections: typing.Set[WebSocket] = set()
+        self.dropped = 0
+
+    def add(self, websocket: WebSocket) -> None:
+        self.connections.add(websocket)
+
+    def discard(self, websocket: WebSocket) -> None:
+        self.connections.discard(websocket)
+
+    def publish(self, data: typing.Union[str, bytes, Message]) -> int:
+        """
+        send message to all connections
+        :param data: text, bytes or asgi message
+        :return: count of connections message is queued for
+        """
+        if isinstance(data, str):
+            message = text_message(data)
+        elif isinstance(data, bytes):
+            message = bytes_message(data)
+        else:
+            message = data
+
+        delivered = 0
+        dropped = []
+        for websocket in self.connections:
+            if websocket.enqueue(message):
+                delivered += 1
+            else:
+                dropped.append(websocket)
+        for websocket in dropped:
+            self.connections.discard(websocket)
+        self.dropped += len(dropped)
+        return delivered
+
+    def __len__(self) -> int:
+        return len(self.connections)
@@ -10,5 +10,6 @@ setup(
     description="simple web framework with features",
     long_description=open("README.md", encoding="utf-8").read(),
     long_description_content_type="text/markdown",
-    install_requires=["uvicorn", "vbml", "jinja2", "aiofile"],
+    install_requires=["uvicorn[standard]>=0.22.0", "vbml", "jinja2", "aiofile"],
+    entry_points={"console_scripts": ["kumquat=kumquat.__main__:main"]},
 )
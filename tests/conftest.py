@@ -0,0 +1,72 @@
+import asyncio
+import typing
+
+import pytest
+
+Message = typing.Dict[str, typing.Any]
+
+
+class Result(typing.NamedTuple):
+    status: int
+    headers: typing.Dict[bytes, bytes]
+    body: bytes
+    raw_headers: typing.List[typing.Tuple[bytes, bytes]]
+
+
+async def request(
+    app: typing.Callable,
+    path: str,
+    method: str = "GET",
+    body: typing.Union[bytes, typing.List[bytes]] = b"",
+    headers: typing.Iterable[typing.Tuple[bytes, bytes]] = (),
+    query: bytes = b"",
+    disconnect: bool = False,
+) -> Result:
+    """
+    send request to asgi app, body can be passed by parts as list,
+    with disconnect client disconnects after body is read
+    """
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "server": ("127.0.0.1", 8000),
+        "client": ("127.0.0.1", 51000),
+        "scheme": "http",
+        "method": method,
+        "root_path": "",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query,
+        "headers": list(headers),
+    }
+    chunks = body if isinstance(body, list) else [body]
+    messages: typing.List[Message] = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent: typing.List[Message] = []
+
+    async def receive() -> Message:
+        if messages:
+            return messages.pop(0)
+        if disconnect:
+            return {"type": "http.disconnect"}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return Result(
+        start["status"],
+        {name.lower(): value for name, value in start["headers"]},
+        b"".join(message.get("body", b"") for message in sent[1:]),
+        list(start["headers"]),
+    )
+
+
+@pytest.fixture
+def call() -> typing.Callable[..., typing.Awaitable[Result]]:
+    return request
@@ -0,0 +1,88 @@
+import asyncio
+
+from kumquat.application import Kumquat
+
+
+def vary_app(**route_options) -> Kumquat:
+    app = Kumquat()
+    app.calls = 0
+
+    @app.get("/lang", cache_vary=["accept-language"], **route_options)
+    async def lang(request, response):
+        app.calls += 1
+        await asyncio.sleep(0.01)
+        return "lang=" + request.headers.get(b"accept-language", b"").decode()
+
+    return app
+
+
+def test_single_flight_key_has_vary_headers(call):
+    app = vary_app(single_flight=True)
+
+    async def main():
+        return await asyncio.gather(
+            call(app, "/lang", headers=[(b"accept-language", b"en")]),
+            call(app, "/lang", headers=[(b"accept-language", b"de")]),
+            call(app, "/lang", headers=[(b"accept-language", b"en")]),
+        )
+
+    en, de, en_again = asyncio.run(main())
+    assert en.body == en_again.body == b"lang=en"
+    assert de.body == b"lang=de"
+    assert app.calls == 2
+
+
+def test_cache_vary(call):
+    app = vary_app(cache=60)
+
+    async def main():
+        await asyncio.gather(
+            call(app, "/lang", headers=[(b"accept-language", b"en")]),
+            call(app, "/lang", headers=[(b"accept-language", b"de")]),
+        )
+        return await call(app, "/lang", headers=[(b"accept-language", b"de")])
+
+    de = asyncio.run(main())
+    assert de.body == b"lang=de"
+    assert de.headers[b"vary"] == b"accept-language"
+    assert app.calls == 2
+
+
+def test_concurrent_cache_misses_share_one_run(call):
+    app = vary_app(cache=60)
+
+    async def main():
+        return await asyncio.gather(
+            *[
+                call(app, "/lang", headers=[(b"accept-language", b"en")])
+                for _ in range(10)
+            ]
+        )
+
+    results = asyncio.run(main())
+    assert {result.body for result in results} == {b"lang=en"}
+    assert app.calls == 1
+
+
+def test_not_modified(call):
+    app = vary_app(cache=60)
+    en = [(b"accept-language", b"en")]
+
+    async def main():
+        first = await call(app, "/lang", headers=en)
+        etag = first.headers[b"etag"]
+        return (
+            etag,
+            await call(app, "/lang", headers=en + [(b"if-none-match", etag)]),
+            await call(app, "/lang", headers=en + [(b"if-none-match", b"W/" + etag)]),
+            await call(app, "/lang", headers=en + [(b"if-none-match", b'"other"')]),
+        )
+
+    etag, not_modified, weak_not_modified, modified = asyncio.run(main())
+    for result in (not_modified, weak_not_modified):
+        assert result.status == 304
+        assert result.body == b""
+        assert result.headers[b"etag"] == etag
+    assert modified.status == 200
+    assert modified.body == b"lang=en"
+    assert app.calls == 1
@@ -0,0 +1,51 @@
+import asyncio
+
+from kumquat.application import Kumquat
+from kumquat.compression import Compression, add_vary, weak_etag
+
+BODY = "kumquat " * 200
+
+
+def cached_app() -> Kumquat:
+    app = Kumquat(compression=Compression(encodings=("gzip",)))
+
+    @app.get("/", cache=60, cache_vary=["accept-language"])
+    async def index(request, response):
+        return BODY
+
+    return app
+
+
+def test_compressed_response_has_weak_etag_and_one_vary(call):
+    app = cached_app()
+    headers = [(b"accept-encoding", b"gzip"), (b"accept-language", b"en")]
+
+    async def main():
+        first = await call(app, "/", headers=headers)
+        etag = first.headers[b"etag"]
+        second = await call(app, "/", headers=headers + [(b"if-none-match", etag)])
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first.headers[b"content-encoding"] == b"gzip"
+    assert first.headers[b"etag"].startswith(b'W/"')
+    assert [value for name, value in first.raw_headers if name == b"vary"] == [
+        b"accept-language, accept-encoding"
+    ]
+    assert second.status == 304
+    assert second.headers[b"etag"] == first.headers[b"etag"]
+
+
+def test_identity_response_keeps_strong_etag(call):
+    result = asyncio.run(call(cached_app(), "/"))
+    assert b"content-encoding" not in result.headers
+    assert result.headers[b"etag"].startswith(b'"')
+
+
+def test_add_vary():
+    assert add_vary(b"accept-language", b"accept-encoding") == (
+        b"accept-language, accept-encoding"
+    )
+    assert add_vary(b"Accept-Encoding", b"accept-encoding") == b"Accept-Encoding"
+    assert add_vary(b"*", b"accept-encoding") == b"*"
+    assert weak_etag(b'W/"a"') == b'W/"a"'
@@ -0,0 +1,50 @@
+import asyncio
+
+from kumquat.application import Kumquat
+from kumquat.response import HTMLResponse, JsonResponse
+
+
+def test_response_class_is_applied_to_tuple_result(call):
+    app = Kumquat()
+
+    @app.get("/", response_class=HTMLResponse)
+    async def index(request, response):
+        return "<h1>x</h1>", 201
+
+    result = asyncio.run(call(app, "/"))
+    assert result.status == 201
+    assert result.headers[b"content-type"].startswith(b"text/html")
+    assert result.body == b"<h1>x</h1>"
+
+
+def test_response_object_is_sent_as_is_with_response_class(call):
+    app = Kumquat()
+
+    @app.get("/", response_class=HTMLResponse)
+    async def index(request, response):
+        return JsonResponse({"a": 1}), 202
+
+    result = asyncio.run(call(app, "/"))
+    assert result.status == 202
+    assert result.headers[b"content-type"].startswith(b"application/json")
+
+
+def test_bytes_and_none_results(call):
+    app = Kumquat()
+
+    @app.get("/bytes")
+    async def raw(request, response):
+        return b"\x00data"
+
+    @app.get("/none")
+    async def empty(request, response):
+        return None
+
+    @app.get("/html-none", response_class=HTMLResponse)
+    async def html_empty(request, response):
+        return None, 204
+
+    assert asyncio.run(call(app, "/bytes")).body == b"\x00data"
+    assert asyncio.run(call(app, "/none")).body == b""
+    result = asyncio.run(call(app, "/html-none"))
+    assert (result.status, result.body) == (204, b"")
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+import pytest
+
+from kumquat.exceptions import ExecutorRejected, KumquatException
+from kumquat.application import Kumquat
+from kumquat.utils import BackgroundTask, Executor
+
+
+def run_blocked(executor: Executor, count: int):
+    """
+    submit count tasks blocked until all are submitted
+    :return: results or exceptions of tasks
+    """
+    release = threading.Event()
+
+    async def main():
+        tasks = [
+            asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(count)
+        ]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        return asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+
+def test_zero_queue_runs_tasks_on_idle_workers():
+    executor = Executor("thread", max_workers=4, max_queue=0)
+    results = run_blocked(executor, 4)
+    assert results == [True] * 4
+    assert executor.metrics.rejected == 0
+
+
+def test_zero_queue_rejects_tasks_over_workers():
+    executor = Executor("thread", max_workers=2, max_queue=0)
+    results = run_blocked(executor, 3)
+    assert results[:2] == [True, True]
+    assert isinstance(results[2], ExecutorRejected)
+    assert executor.metrics.rejected == 1
+
+
+def test_queue_limit():
+    executor = Executor("thread", max_workers=1, max_queue=2)
+    results = run_blocked(executor, 4)
+    assert results[:3] == [True] * 3
+    assert isinstance(results[3], ExecutorRejected)
+
+
+def test_executor_kind():
+    with pytest.raises(KumquatException):
+        Executor("fiber")
+
+
+def test_background_task_uses_executor_of_app(call):
+    apps = [Kumquat(executors={"db": Executor("thread", max_workers=1)}) for _ in "ab"]
+    for app in apps:
+
+        @app.get("/")
+        async def index(request, response):
+            return await BackgroundTask.with_executor("db", lambda: 1)()
+
+    asyncio.run(call(apps[0], "/"))
+    assert apps[0].executors["db"].metrics.submitted == 1
+    assert apps[1].executors["db"].metrics.submitted == 0
+    assert not hasattr(BackgroundTask, "executors")
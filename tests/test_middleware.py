@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+
+from kumquat.application import Kumquat
+from kumquat.exceptions import KumquatException
+
+
+def test_after_middleware_gets_short_circuited_response(call):
+    app = Kumquat()
+    calls = []
+
+    @app.middleware("before")
+    async def auth(request, response):
+        if not request.headers.get(b"authorization"):
+            return "Unauthorized", 401
+
+    @app.middleware("around")
+    async def around(request, response, call_next):
+        calls.append("around")
+        return await call_next()
+
+    @app.middleware()
+    async def after(request, response):
+        calls.append("after")
+        response.set_headers({"x-after": "1"})
+
+    @app.get("/")
+    async def index(request, response):
+        return "ok"
+
+    async def main():
+        return (
+            await call(app, "/"),
+            await call(app, "/", headers=[(b"authorization", b"token")]),
+            await call(app, "/nothing", headers=[(b"authorization", b"token")]),
+        )
+
+    denied, allowed, not_found = asyncio.run(main())
+    assert (denied.status, denied.body) == (401, b"Unauthorized")
+    assert allowed.body == b"ok"
+    assert not_found.status == 404
+    for result in (denied, allowed, not_found):
+        assert result.headers[b"x-after"] == b"1"
+    assert calls == ["after", "around", "after", "around", "after"]
+
+
+def test_plain_funcs_in_middleware_stack(call):
+    app = Kumquat()
+    threads = []
+
+    async def coroutine_func(request, response):
+        response.set_headers({"x-async": "1"})
+
+    def sync_func(request, response):
+        threads.append(threading.current_thread().name)
+        response.set_headers({"x-sync": "1"})
+
+    app.middleware_stack.extend([coroutine_func, sync_func])
+    app.get("/")(lambda request, response: "ok")
+
+    result = asyncio.run(call(app, "/"))
+    assert result.headers[b"x-async"] == result.headers[b"x-sync"] == b"1"
+    # sync funcs are blocking, they are run in "thread" executor of app
+    assert threads[0].startswith("kumquat-thread")
+
+
+def test_not_callable_in_middleware_stack():
+    app = Kumquat()
+    app.middleware_stack.append("middleware")
+    with pytest.raises(KumquatException):
+        app.compile()
@@ -0,0 +1,120 @@
+import asyncio
+import json
+
+import pytest
+
+from kumquat.application import Kumquat
+from kumquat.exceptions import HTTPException
+from kumquat.multipart import MultipartReader
+
+BOUNDARY = b"kumquat-boundary"
+BODY = (
+    b"preamble\r\n"
+    b"--kumquat-boundary\r\n"
+    b'Content-Disposition: form-data; name="title"\r\n'
+    b"\r\n"
+    b"hello\r\n--kumquat\r\n"
+    b"--kumquat-boundary\r\n"
+    b'Content-Disposition: form-data; name="file"; filename="a.bin"\r\n'
+    b"Content-Type: application/octet-stream\r\n"
+    b"\r\n"
+    b"\x00data\r\n"
+    b"--kumquat-boundary--\r\n"
+)
+CONTENT_TYPE = (b"content-type", b"multipart/form-data; boundary=kumquat-boundary")
+
+
+async def iterate(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def read_parts(reader: MultipartReader):
+    return [
+        (part.name, part.filename, part.content_type, await part.read())
+        async for part in reader
+    ]
+
+
+EXPECTED = [
+    ("title", None, "text/plain", b"hello\r\n--kumquat"),
+    ("file", "a.bin", "application/octet-stream", b"\x00data"),
+]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(BODY)])
+def test_parts_split_across_chunks(size):
+    chunks = [BODY[i : i + size] for i in range(0, len(BODY), size)]
+    reader = MultipartReader(iterate(chunks), BOUNDARY)
+    assert asyncio.run(read_parts(reader)) == EXPECTED
+
+
+def test_every_split_position():
+    async def main():
+        for index in range(len(BODY)):
+            chunks = [BODY[:index], BODY[index:]]
+            assert await read_parts(MultipartReader(iterate(chunks), BOUNDARY)) == (
+                EXPECTED
+            )
+
+    asyncio.run(main())
+
+
+def test_not_consumed_part_is_skipped():
+    async def main():
+        reader = MultipartReader(iterate([BODY]), BOUNDARY)
+        await reader.next_part()
+        part = await reader.next_part()
+        return part.name, await part.read(), await reader.next_part()
+
+    assert asyncio.run(main()) == ("file", b"\x00data", None)
+
+
+def test_truncated_body():
+    reader = MultipartReader(iterate([BODY[:-30]]), BOUNDARY)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(read_parts(reader))
+    assert exc_info.value.status_code == 400
+
+
+def multipart_app(**app_options) -> Kumquat:
+    app = Kumquat(**app_options)
+
+    @app.post("/upload")
+    async def upload(request, response):
+        parts = request.multipart(max_part_size=32)
+        return {part.name: len(await part.read()) async for part in parts}
+
+    return app
+
+
+def test_multipart_route(call):
+    # body arrives by one byte
+    chunks = [BODY[i : i + 1] for i in range(len(BODY))]
+    result = asyncio.run(
+        call(multipart_app(), "/upload", "POST", chunks, [CONTENT_TYPE])
+    )
+    assert result.status == 200
+    assert json.loads(result.body) == {"title": 16, "file": 5}
+
+
+@pytest.mark.parametrize("content_length", [True, False])
+def test_body_bigger_than_max_body_size(call, content_length):
+    headers = [CONTENT_TYPE]
+    if content_length:
+        headers.append((b"content-length", str(len(BODY)).encode()))
+    app = multipart_app(max_body_size=len(BODY) - 1)
+    chunks = [BODY[:100], BODY[100:]]
+    result = asyncio.run(call(app, "/upload", "POST", chunks, headers))
+    assert result.status == 413
+
+
+def test_part_bigger_than_max_part_size(call):
+    body = BODY.replace(b"\x00data", b"x" * 33)
+    result = asyncio.run(call(multipart_app(), "/upload", "POST", body, [CONTENT_TYPE]))
+    assert result.status == 413
+
+
+def test_body_is_not_multipart(call):
+    result = asyncio.run(call(multipart_app(), "/upload", "POST", BODY))
+    assert result.status == 400
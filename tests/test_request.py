@@ -0,0 +1,58 @@
+import asyncio
+
+from kumquat.request import Request
+
+
+def make_request(receive, headers=()) -> Request:
+    return Request({"type": "http", "path": "/", "headers": list(headers)}, receive)
+
+
+def test_is_disconnected_after_disconnect():
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def main():
+        request = make_request(receive)
+        return await request.is_disconnected()
+
+    assert asyncio.run(main()) is True
+
+
+def test_is_disconnected_notices_late_disconnect():
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if not disconnected.is_set():
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(0.01)
+        return {"type": "http.disconnect"}
+
+    async def main():
+        request = make_request(receive)
+        await request.bytes()
+        disconnected.set()
+        before = await request.is_disconnected()
+        await asyncio.sleep(0.05)
+        after = await request.is_disconnected()
+        # response waiting for disconnect gets it too
+        message = await request.receive()
+        return before, after, message["type"]
+
+    assert asyncio.run(main()) == (False, True, "http.disconnect")
+
+
+def test_is_disconnected_connected_client():
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.sleep(3600)
+
+    async def main():
+        request = make_request(receive)
+        result = await request.is_disconnected()
+        request.close()
+        return result
+
+    assert asyncio.run(main()) is False
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import time
+
+from kumquat.response import StreamingResponse
+
+
+def stream(response: StreamingResponse):
+    sent = []
+
+    async def receive():
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    async def main():
+        ticks = 0
+        task = asyncio.ensure_future(response({"type": "http"}, receive, send))
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.005)
+        await task
+        return ticks
+
+    ticks = asyncio.run(main())
+    return ticks, b"".join(message.get("body", b"") for message in sent[1:])
+
+
+def test_blocking_generator_is_read_in_thread():
+    threads = set()
+
+    def rows():
+        for i in range(3):
+            threads.add(threading.get_ident())
+            time.sleep(0.05)
+            yield f"row{i}\n"
+
+    ticks, body = stream(StreamingResponse(rows()))
+    assert body == b"row0\nrow1\nrow2\n"
+    assert threading.get_ident() not in threads
+    # event loop kept running while rows were read
+    assert ticks > 10
+
+
+def test_list_body():
+    ticks, body = stream(StreamingResponse(["a", b"b"]))
+    assert body == b"ab"
@@ -0,0 +1,73 @@
+import asyncio
+
+from kumquat.application import Kumquat
+from kumquat.route import Route, Router
+
+
+def handler(request, response):
+    return ""
+
+
+def make_router(*routes) -> Router:
+    router = Router()
+    for path, methods in routes:
+        router.add_route(Route(path, handler, methods))
+    return router
+
+
+def test_static_segment_has_precedence():
+    router = make_router(("/users/<name>", ("GET",)), ("/users/me", ("GET",)))
+    assert router.get_route("/users/me", "GET")[1].path == "/users/me"
+    path_dict, route = router.get_route("/users/kumquat", "GET")
+    assert route.path == "/users/<name>"
+    assert path_dict == {"name": "kumquat"}
+
+
+def test_backtracks_to_param_segment():
+    router = make_router(
+        ("/users/me/posts", ("GET",)), ("/users/<name>/likes", ("GET",))
+    )
+    path_dict, route = router.get_route("/users/me/likes", "GET")
+    assert route.path == "/users/<name>/likes"
+    assert path_dict == {"name": "me"}
+
+
+def test_backtracks_to_route_with_method():
+    router = make_router(("/items/new", ("GET",)), ("/items/<id>", ("POST",)))
+    path_dict, route = router.get_route("/items/new", "POST")
+    assert route.path == "/items/<id>"
+    assert path_dict == {"id": "new"}
+
+
+def test_pattern_routes_after_tree():
+    router = make_router(("/files/<name>.json", ("GET",)), ("/files/all", ("GET",)))
+    assert router.get_route("/files/all", "GET")[1].path == "/files/all"
+    path_dict, route = router.get_route("/files/a.json", "GET")
+    assert route.path == "/files/<name>.json"
+    assert path_dict == {"name": "a"}
+
+
+def test_not_found():
+    router = make_router(("/users/<name>", ("GET",)))
+    assert router.get_route("/users", "GET") == ({}, None)
+    assert router.get_route("/users/a/b", "GET") == ({}, None)
+
+
+def test_not_allowed_has_allow_header(call):
+    app = Kumquat()
+    app.get("/items/<id>")(handler)
+    app.route("/items/new", methods=("POST", "PUT"))(handler)
+
+    async def main():
+        return await asyncio.gather(
+            call(app, "/items/new", method="DELETE"),
+            call(app, "/items/7", method="POST"),
+            call(app, "/nothing"),
+        )
+
+    not_allowed, param_not_allowed, not_found = asyncio.run(main())
+    assert not_allowed.status == 405
+    assert not_allowed.headers[b"allow"] == b"POST, PUT, GET"
+    assert param_not_allowed.status == 405
+    assert param_not_allowed.headers[b"allow"] == b"GET"
+    assert not_found.status == 404
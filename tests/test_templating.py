@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from kumquat.application import Kumquat
+from kumquat.context import templates_var
+from kumquat.exceptions import KumquatException
+from kumquat.response import StreamingTemplateResponse, TemplateResponse
+from kumquat.serialization import JSONCodec
+from kumquat.templating import Templates
+
+
+def send_response(response) -> bytes:
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(response({"type": "http"}, receive, send))
+    return b"".join(message.get("body", b"") for message in sent[1:])
+
+
+@pytest.mark.parametrize(
+    "responses",
+    [
+        (TemplateResponse, StreamingTemplateResponse),
+        (StreamingTemplateResponse, TemplateResponse),
+    ],
+)
+def test_sync_and_async_rendering_share_bytecode_dir(tmp_path, responses):
+    templates_path = tmp_path / "templates"
+    templates_path.mkdir()
+    (templates_path / "index.html").write_text("hello {{ name }}")
+    bytecode_path = tmp_path / "bytecode"
+    bytecode_path.mkdir()
+
+    for response_class in responses * 2:
+        # new environment every time, so template is loaded from bytecode
+        templates_var.set(
+            Templates(str(templates_path), bytecode_cache=str(bytecode_path))
+        )
+        response = response_class("index.html", name="kumquat")
+        assert send_response(response) == b"hello kumquat"
+
+
+def test_apps_use_own_templates_and_codec(tmp_path, call):
+    apps = []
+    for name in ("first", "second"):
+        path = tmp_path / name
+        path.mkdir()
+        (path / "index.html").write_text(name)
+        app = Kumquat(
+            templates_path=str(path),
+            json_codec=JSONCodec(default=lambda obj, name=name: name),
+        )
+        app.get("/")(lambda request, response: TemplateResponse("index.html"))
+        app.get("/json")(lambda request, response: {"app": object()})
+        apps.append(app)
+
+    async def main():
+        return [
+            ((await call(app, "/")).body, (await call(app, "/json")).body)
+            for app in apps
+        ]
+
+    assert asyncio.run(main()) == [
+        (b"first", b'{"app": "first"}'),
+        (b"second", b'{"app": "second"}'),
+    ]
+
+
+def test_template_response_outside_of_app():
+    templates_var.set(None)
+    with pytest.raises(KumquatException):
+        send_response(TemplateResponse("index.html"))